@@ -0,0 +1,68 @@
+"""Compare per-pass and batched wkhtmltopdf rendering on a synthetic run
+
+Uses the wkhtmltopdf named by WKHTMLTOPDF_PATH (see README).
+Usage: python benchmarks/bench_batch_render.py [--passes 1000] [--batch-size 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from generate_guest_passes import generate_diamond_pass_pdf, generate_diamond_pass_pdf_batch
+
+
+def synthetic_passes(count, output_dir):
+    """Return `(data, output_path)` pairs shaped like the ones main() builds"""
+    items = []
+    for i in range(count):
+        data = {
+            'ACADEMIC_YEAR_START': '2025',
+            'ACADEMIC_YEAR_END': '2026',
+            'PASS_TYPE': 'UNIVERSITY OF NOTRE DAME',
+            'PARKING_TYPE': 'GUEST PARKING PASS',
+            'VALID_UNTIL': '01/30/25 - 01/31/25',
+            'LOT': 'C LOT',
+            'ADD LOT': 'OR B1 LOT' if i % 3 == 0 else '',
+            'PASS_NUMBER': str(10000 + i)
+        }
+        items.append((data, os.path.join(output_dir, f"diamondPass_BENCH_{10000 + i}.pdf")))
+    return items
+
+
+def run_per_pass(items, javascript_delay):
+    start = time.perf_counter()
+    ok = sum(1 for data, path in items if generate_diamond_pass_pdf(data, path, javascript_delay))
+    return time.perf_counter() - start, ok
+
+
+def run_batched(items, batch_size, javascript_delay):
+    start = time.perf_counter()
+    ok = 0
+    for i in range(0, len(items), batch_size):
+        ok += sum(1 for path in generate_diamond_pass_pdf_batch(items[i:i + batch_size], javascript_delay) if path)
+    return time.perf_counter() - start, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--passes', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--javascript-delay', type=int, default=0, help="Milliseconds; 0 disables it")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        per_pass_time, per_pass_ok = run_per_pass(synthetic_passes(args.passes, os.path.join(tmp, 'single')),
+                                                  args.javascript_delay)
+        batched_time, batched_ok = run_batched(synthetic_passes(args.passes, os.path.join(tmp, 'batched')),
+                                               args.batch_size, args.javascript_delay)
+
+    print(f"Passes: {args.passes}, batch size: {args.batch_size}")
+    print(f"Per-pass: {per_pass_time:.2f}s, {per_pass_ok / per_pass_time:.1f} passes/s ({per_pass_ok} ok)")
+    print(f"Batched:  {batched_time:.2f}s, {batched_ok / batched_time:.1f} passes/s ({batched_ok} ok)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Compare the bytes uploaded per message for each way of building the email bodies
+
+"data: URI" is how bodies used to be sent: the ParkMobile screenshot inlined
+as base64 in the HTML, which was then base64-encoded again. "cid:" attaches
+the screenshot once as an inline part and sends the HTML quoted-printable.
+Sizes are of the base64url `raw` field sent to messages.send.
+Usage: python benchmarks/bench_email_size.py
+"""
+import base64
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from generate_guest_passes import (build_email_message, generate_diamond_email_body,
+                                   generate_diamond_pass_pdf_native, generate_parkmobile_email_body,
+                                   PARKMOBILE_IMAGE_PATH)
+from template_cache import read_base64
+
+ROW = {'FIRST_NAME': 'Guest', 'PARKMOBILE': 'PM123456', 'PASS #': 100001, 'EVENT': 'Home Game'}
+START = datetime(2025, 1, 30)
+END = datetime(2025, 1, 31)
+
+
+def uploaded_bytes(msg):
+    return len(base64.urlsafe_b64encode(msg.as_bytes()))
+
+
+def data_uri_message(body, pdf_path):
+    """Build the message the way it was built before cid: images"""
+    body = re.sub(r'src="cid:[^"]+"', f'src="data:image/png;base64,{read_base64(PARKMOBILE_IMAGE_PATH)}"', body)
+    msg = build_email_message('parking@nd.edu', 'guest@nd.edu', 'Subject', '', pdf_path)
+    msg.set_payload([MIMEText(body, 'html')] + msg.get_payload()[1:])
+    return msg
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = generate_diamond_pass_pdf_native({
+            'ACADEMIC_YEAR_START': '2025', 'ACADEMIC_YEAR_END': '2026',
+            'PASS_TYPE': 'UNIVERSITY OF NOTRE DAME', 'PARKING_TYPE': 'GUEST PARKING PASS',
+            'VALID_UNTIL': '01/30/25 - 01/31/25', 'LOT': 'C LOT', 'ADD LOT': '', 'PASS_NUMBER': '100001'
+        }, os.path.join(tmp, 'diamondPass.pdf'))
+
+        kinds = [('ParkMobile', generate_parkmobile_email_body, None),
+                 ('Diamond Pass', generate_diamond_email_body, pdf_path)]
+        print(f"{'Email':<14}{'data: URI, full':>18}{'cid:, full':>14}{'cid:, minified':>18}")
+        for name, build_body, attachment in kinds:
+            full = build_body(ROW, START, END, minify=False)
+            minified = build_body(ROW, START, END, minify=True)
+            sizes = [
+                uploaded_bytes(data_uri_message(full, attachment)),
+                uploaded_bytes(build_email_message('parking@nd.edu', 'guest@nd.edu', 'Subject', full, attachment)),
+                uploaded_bytes(build_email_message('parking@nd.edu', 'guest@nd.edu', 'Subject', minified, attachment))
+            ]
+            print(f"{name:<14}{sizes[0]:>18,}{sizes[1]:>14,}{sizes[2]:>18,}"
+                  f"   ({1 - sizes[2] / sizes[0]:.0%} smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Compare per-message Gmail setup with a reused GmailSender against a local stub
+
+Usage: python benchmarks/bench_gmail_sender.py [--messages 200] [--latency 0.0]
+"""
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from fake_gmail import FakeGmailServer, fake_credentials
+from gmail_sender import GmailSender
+from generate_guest_passes import generate_email
+
+
+def run_per_message(count, endpoint, token_file):
+    """Old behaviour: unpickle the token and build the service for every email"""
+    start = time.perf_counter()
+    for i in range(count):
+        with open(token_file, 'rb') as token:
+            creds = pickle.load(token)
+        sender = GmailSender(creds, api_endpoint=endpoint)
+        generate_email(f"guest{i}@example.com", "Benchmark", "<p>hello</p>", sender=sender)
+    return time.perf_counter() - start
+
+
+def run_reused(count, endpoint):
+    """New behaviour: one GmailSender for the whole run"""
+    start = time.perf_counter()
+    sender = GmailSender(fake_credentials(), api_endpoint=endpoint)
+    for i in range(count):
+        generate_email(f"guest{i}@example.com", "Benchmark", "<p>hello</p>", sender=sender)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds the stub waits per request")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, FakeGmailServer(latency=args.latency) as server:
+        token_file = os.path.join(tmp, 'token.pickle')
+        with open(token_file, 'wb') as token:
+            pickle.dump(fake_credentials(), token)
+
+        per_message = run_per_message(args.messages, server.endpoint, token_file)
+        reused = run_reused(args.messages, server.endpoint)
+
+    print(f"Messages: {args.messages}")
+    print(f"Per-message setup: {per_message:.3f}s ({per_message / args.messages * 1000:.2f} ms/msg)")
+    print(f"Reused sender:     {reused:.3f}s ({reused / args.messages * 1000:.2f} ms/msg)")
+    print(f"Speedup: {per_message / reused:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Compare the PDF bytes per pass of each render profile
+
+Renders the same passes with every profile in RENDER_PROFILES. The html
+backend uses the wkhtmltopdf named by WKHTMLTOPDF_PATH (see README).
+Usage: python benchmarks/bench_render_profile.py [--backend native] [--passes 20]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from generate_guest_passes import generate_diamond_pass_pdf, RENDER_PROFILES
+from bench_batch_render import synthetic_passes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['html', 'native'], default='native')
+    parser.add_argument('--passes', type=int, default=20)
+    args = parser.parse_args()
+
+    items = synthetic_passes(args.passes, '')
+    sizes = {}
+    for profile in RENDER_PROFILES:
+        pdfs = [generate_diamond_pass_pdf(data, None, javascript_delay=0, backend=args.backend, profile=profile)
+                for data, _ in items]
+        if not all(pdfs):
+            print(f"{profile}: rendering failed")
+            return
+        sizes[profile] = sum(len(pdf) for pdf in pdfs) / len(pdfs)
+
+    baseline = sizes['print']
+    print(f"{'Profile':<10}{'bytes/pass':>12}")
+    for profile, size in sizes.items():
+        change = f"   ({1 - size / baseline:.0%} smaller)" if profile != 'print' else ''
+        print(f"{profile:<10}{size:>12,.0f}{change}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Profile what importing the pipeline costs, and how long the CLI takes to start
+
+Runs `python -X importtime` on a module in a fresh interpreter and lists the
+slowest imports, then times `generate_guest_passes.py --help` end to end.
+Pass a stage module (e.g. --module planning or --module gmail_sender) to see
+what that stage pulls in when it is first used.
+Usage: python benchmarks/bench_startup.py [--module generate_guest_passes] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+
+def import_times(module):
+    """Return [(cumulative_us, self_us, depth, name)] for every module imported by `import module`"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=SRC_DIR, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cumulative_us), int(self_us), depth, name.strip()))
+    return rows
+
+
+def cli_startup_seconds(repeat):
+    script = os.path.join(SRC_DIR, 'generate_guest_passes.py')
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, script, '--help'], capture_output=True, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='generate_guest_passes')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--repeat', type=int, default=5, help="CLI start-up runs to take the median of")
+    args = parser.parse_args()
+
+    rows = import_times(args.module)
+    # The module's own line comes after everything it imported, which is listed one level deeper;
+    # earlier top-level lines are the interpreter's own start-up (site, .pth files)
+    end = max(i for i, row in enumerate(rows) if row[2] == 0 and row[3] == args.module)
+    start = end
+    while start > 0 and rows[start - 1][2] > 0:
+        start -= 1
+    subtree = rows[start:end]
+    print(f"import {args.module}: {rows[end][0] / 1000:.1f} ms, {len(subtree) + 1} modules")
+    print(f"{'cumulative':>12}{'self':>10}  module")
+    direct = sorted((row for row in subtree if row[2] == 1), reverse=True)
+    for cumulative, self_us, _, name in direct[:args.top]:
+        print(f"{cumulative / 1000:>10.1f}ms{self_us / 1000:>8.1f}ms  {name}")
+
+    print(f"\ngenerate_guest_passes.py --help: {cli_startup_seconds(args.repeat) * 1000:.0f} ms (median of {args.repeat})")
+
+
+if __name__ == "__main__":
+    main()
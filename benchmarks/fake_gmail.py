@@ -0,0 +1,83 @@
+"""Local stand-in for the Gmail messages.send endpoint used by the benchmarks"""
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGmailHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real endpoint
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.error_rate and server.random.random() < server.error_rate:
+            with server.lock:
+                server.rate_limited += 1
+            self._reply(429, {'error': {
+                'code': 429,
+                'message': 'User-rate limit exceeded',
+                'errors': [{'reason': 'rateLimitExceeded', 'domain': 'usageLimits'}]
+            }})
+            return
+
+        with server.lock:
+            server.requests += 1
+            server.bytes_received += length
+        self._reply(200, {
+            'id': uuid.uuid4().hex[:16],
+            'threadId': uuid.uuid4().hex[:16],
+            'labelIds': ['SENT']
+        })
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeGmailServer(ThreadingHTTPServer):
+    """Accepts sends after `latency` seconds; answers a fraction `error_rate` with 429 rateLimitExceeded"""
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None):
+        super().__init__(('127.0.0.1', 0), FakeGmailHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.rate_limited = 0
+        self.bytes_received = 0
+        self.lock = threading.Lock()
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def fake_credentials():
+    """Return credentials that never need refreshing, for talking to the fake server"""
+    from google.oauth2.credentials import Credentials
+    return Credentials(token='benchmark-token')
@@ -0,0 +1,47 @@
+"""Stand-in for wkhtmltopdf: reads HTML on stdin and writes one blank page per pass
+
+Waits FAKE_PDF_LATENCY seconds first to mimic the engine's start-up and
+render time. Use install() to get an executable path for WKHTMLTOPDF_PATH.
+"""
+import io
+import os
+import sys
+import time
+
+
+def install(directory):
+    """Write a launcher for this script into `directory` and return its path"""
+    script = os.path.abspath(__file__)
+    if os.name == 'nt':
+        path = os.path.join(directory, 'fake_wkhtmltopdf.bat')
+        with open(path, 'w') as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        path = os.path.join(directory, 'fake_wkhtmltopdf')
+        with open(path, 'w') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+        os.chmod(path, 0o755)
+    return path
+
+
+def main():
+    from pypdf import PdfWriter
+
+    html = sys.stdin.read() if '-' in sys.argv[1:-1] else ''
+    pages = max(1, html.count('class="batch-page"'))
+    time.sleep(float(os.getenv('FAKE_PDF_LATENCY', '0')))
+
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(612, 792)
+    if sys.argv[-1] == '-':  # pdfkit asks for the PDF on stdout when it returns bytes
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        sys.stdout.buffer.write(buffer.getvalue())
+    else:
+        with open(sys.argv[-1], 'wb') as f:
+            writer.write(f)
+
+
+if __name__ == "__main__":
+    main()
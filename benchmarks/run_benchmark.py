@@ -0,0 +1,222 @@
+"""End-to-end offline benchmark of the pass pipeline
+
+Generates a synthetic master file, then runs the same read/plan/render/send
+pipeline as main() against a local fake Gmail endpoint, rendering with the
+fake wkhtmltopdf (--pdf fake), reportlab (--pdf native) or the real
+wkhtmltopdf from WKHTMLTOPDF_PATH (--pdf html). Reports rows/s, p50/p95
+latency per stage and peak memory, and saves the results as JSON.
+Usage: python benchmarks/run_benchmark.py [--rows 5000] [--pdf fake] [--gmail-latency 0.05]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARKS_DIR), 'src'))
+
+import fake_wkhtmltopdf
+from fake_gmail import FakeGmailServer, fake_credentials
+from synthetic_master import generate_master_file
+
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (None if it is empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))]
+
+
+def summarize(seconds):
+    """Count and p50/p95/max in milliseconds"""
+    if not seconds:
+        return {'count': 0}
+    return {
+        'count': len(seconds),
+        'p50_ms': round(percentile(seconds, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(seconds, 0.95) * 1000, 3),
+        'max_ms': round(max(seconds) * 1000, 3)
+    }
+
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process and of its finished children (the render workers)"""
+    if resource is None:  # fall back to the Python heap peak tracked by tracemalloc
+        return {'self_mb': round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1), 'children_mb': None,
+                'source': 'tracemalloc'}
+    scale = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is bytes on macOS, KiB elsewhere
+    return {
+        'self_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20, 1),
+        'children_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 2 ** 20, 1),
+        'source': 'ru_maxrss'
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--diamond-ratio', type=float, default=0.7)
+    parser.add_argument('--invalid-ratio', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pdf', choices=['fake', 'native', 'html'], default='fake',
+                        help="PDF engine: fake wkhtmltopdf, reportlab, or the real wkhtmltopdf")
+    parser.add_argument('--fake-pdf-latency', type=float, default=0.05,
+                        help="Seconds each fake wkhtmltopdf call takes")
+    parser.add_argument('--gmail-latency', type=float, default=0.05, help="Seconds per fake Gmail send")
+    parser.add_argument('--gmail-error-rate', type=float, default=0.0,
+                        help="Fraction of sends answered with 429 rateLimitExceeded")
+    parser.add_argument('--output', help="JSON results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('pipeline_args', nargs=argparse.REMAINDER,
+                        help="Options passed through to the pipeline after '--', e.g. -- --send-workers 8")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    pipeline_argv = [arg for arg in args.pipeline_args if arg != '--']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Set up the environment before the pipeline module reads it at import time
+        os.environ['LEDGER_FILE'] = os.path.join(tmp, 'send_ledger.sqlite3')
+        if args.pdf == 'fake':
+            os.environ['WKHTMLTOPDF_PATH'] = fake_wkhtmltopdf.install(tmp)
+            os.environ['FAKE_PDF_LATENCY'] = str(args.fake_pdf_latency)
+
+        import generate_guest_passes as pipeline
+        from gmail_sender import GmailSender
+        from rate_limit import TokenBucket
+        from run_metrics import RunMetrics
+
+        class BenchmarkRun(pipeline.PassRun):
+            """PassRun that times every stage"""
+
+            def __init__(self, *run_args):
+                super().__init__(*run_args)
+                self.timings = {'plan_chunk': [], 'prepare': [], 'render': [], 'send': []}
+                self.render_started = {}
+
+            def plan(self, df):
+                start = time.perf_counter()
+                jobs = super().plan(df)
+                self.timings['plan_chunk'].append(time.perf_counter() - start)
+                return jobs
+
+            def prepare(self, job):
+                start = time.perf_counter()
+                step = super().prepare(job)
+                now = time.perf_counter()
+                self.timings['prepare'].append(now - start)
+                if step == 'render':
+                    self.render_started[job.pass_number] = now
+                return step
+
+            def record_render(self, job, pdf_path):
+                started = self.render_started.pop(job.pass_number, None)
+                if started is not None:
+                    self.timings['render'].append(time.perf_counter() - started)
+                return super().record_render(job, pdf_path)
+
+            def send(self, job):
+                start = time.perf_counter()
+                try:
+                    return super().send(job)
+                finally:
+                    self.timings['send'].append(time.perf_counter() - start)
+
+            def send_digest(self, group):
+                if len(group) == 1:
+                    return super().send_digest(group)  # sent (and timed) by send()
+                start = time.perf_counter()
+                try:
+                    return super().send_digest(group)
+                finally:
+                    self.timings['send'].append(time.perf_counter() - start)
+
+        csv_path = generate_master_file(os.path.join(tmp, 'master_file.csv'), args.rows,
+                                        diamond_ratio=args.diamond_ratio, invalid_ratio=args.invalid_ratio,
+                                        seed=args.seed)
+        pdf_dir = os.path.join(tmp, 'Diamond Passes')
+        os.makedirs(pdf_dir)
+
+        # The fake endpoint has no quota, so don't throttle to Gmail's unless asked to. Reports and
+        # spooled emails go in the temporary directory, not the project's state/
+        run_args = pipeline.parse_args(['--backend', 'native' if args.pdf == 'native' else 'html',
+                                        '--quota-units-per-second', '1e9',
+                                        '--rejected-report', os.path.join(tmp, 'rejected_rows.csv'),
+                                        '--dead-letter-file', os.path.join(tmp, 'dead_letter.jsonl'),
+                                        '--outbox-dir', os.path.join(tmp, 'outbox')] + pipeline_argv)
+        if resource is None:
+            tracemalloc.start()  # slows the run down, so only used where ru_maxrss is unavailable
+        with FakeGmailServer(latency=args.gmail_latency, error_rate=args.gmail_error_rate,
+                             seed=args.seed) as server:
+            metrics = RunMetrics(os.path.join(tmp, 'run_log.jsonl'))
+            sender = GmailSender(fake_credentials(), api_endpoint=server.endpoint,
+                                 rate_limiter=TokenBucket(run_args.quota_units_per_second), metrics=metrics)
+            run = BenchmarkRun(run_args, sender, pdf_dir, metrics)
+
+            start = time.perf_counter()
+            try:
+                pipeline.process_chunks(run, pipeline.read_master_file(csv_path, run_args.chunk_size))
+            finally:
+                run.close()
+            elapsed = time.perf_counter() - start
+
+        memory = peak_memory_mb()
+        tracemalloc.stop()
+
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'config': {
+            'rows': args.rows, 'diamond_ratio': args.diamond_ratio, 'invalid_ratio': args.invalid_ratio,
+            'seed': args.seed, 'pdf': args.pdf, 'fake_pdf_latency': args.fake_pdf_latency,
+            'gmail_latency': args.gmail_latency, 'gmail_error_rate': args.gmail_error_rate,
+            'pipeline': vars(run_args)
+        },
+        'elapsed_s': round(elapsed, 3),
+        'rows_per_s': round(args.rows / elapsed, 1),
+        'emails_per_s': round(run.emails_sent / elapsed, 1),
+        'diamond_passes': run.diamond_passes,
+        'emails_sent': run.emails_sent,
+        'errors': len(run.errors),
+        'rejected': run.rejected,
+        'gmail': {'accepted': server.requests, 'rate_limited': server.rate_limited,
+                  'bytes_received': server.bytes_received},
+        'stages': {name: summarize(values) for name, values in run.timings.items()},
+        'instrumented_stages': {stage: histogram.summary() for stage, histogram in metrics.stages.items()},
+        'counters': metrics.counter_totals(),
+        'peak_memory': memory
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n{args.rows} rows in {elapsed:.2f}s: {results['rows_per_s']} rows/s, "
+          f"{results['emails_per_s']} emails/s ({run.emails_sent} sent, {len(run.errors)} errors, "
+          f"{run.rejected} rejected)")
+    for name, stats in results['stages'].items():
+        if stats['count']:
+            print(f"  {name:<11} n={stats['count']:<7} p50 {stats['p50_ms']:.1f} ms  p95 {stats['p95_ms']:.1f} ms")
+    print(f"  peak memory: {memory['self_mb']} MB (render workers: {memory['children_mb']} MB)")
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Generate synthetic master_file.csv files for the benchmarks
+
+Rows mix Diamond Pass and ParkMobile requests and use the same messy date
+formats the request form produces: JavaScript Date strings (with and without
+the time zone name), ISO dates and timestamps, US m/d/Y dates and the odd
+unparseable value.
+Usage: python benchmarks/synthetic_master.py OUTPUT.csv [--rows 10000]
+"""
+import argparse
+import csv
+import random
+from datetime import date, timedelta
+
+COLUMNS = ['GENERATE', 'PASS #', 'FIRST_NAME', 'LAST_NAME', 'EMAIL', 'DEPARTMENT', 'START', 'END',
+           'VEHICLE_COUNT', 'ADD LOT', 'PARKMOBILE', 'EVENT', 'SUBMITTED', 'NOTES']
+
+DEPARTMENTS = ['Athletics', 'Card Office', 'Campus Ministry', 'Admissions', 'Alumni Association',
+               'Mendoza College of Business', 'DeBartolo Performing Arts', 'Law School']
+EVENTS = ['Home Game', 'Commencement', 'Board Meeting', 'Open House', 'Visiting Speaker', 'Conference']
+LOTS = ['B1 LOT', 'D2 LOT', 'A16 LOT']
+GARBAGE_DATES = ['TBD', 'next week', '13/45/2025', '']
+
+
+def format_messy_date(day, rng):
+    """Format a date the way one of the request form's many sources might"""
+    style = rng.random()
+    if style < 0.45:
+        text = day.strftime('%a %b %d %Y 08:00:00 GMT-0500')
+        return text + ' (Eastern Standard Time)' if rng.random() < 0.7 else text
+    if style < 0.7:
+        return day.isoformat()
+    if style < 0.85:
+        return f"{day.month}/{day.day}/{day.year}"
+    return day.isoformat() + 'T13:00:00.000Z'
+
+
+def synthetic_rows(rows, diamond_ratio=0.7, invalid_ratio=0.01, generate_ratio=0.9, recipients=None, seed=0):
+    """Yield master file rows as lists in COLUMNS order"""
+    rng = random.Random(seed)
+    recipients = recipients or max(1, rows // 4)
+    first_day = date(2025, 1, 6)
+
+    for i in range(rows):
+        start = first_day + timedelta(days=rng.randrange(365))
+        end = start + timedelta(days=rng.choice([0, 0, 0, 1, 2, 6]))
+        start_text = format_messy_date(start, rng)
+        end_text = format_messy_date(end, rng)
+        if rng.random() < invalid_ratio:
+            start_text = rng.choice(GARBAGE_DATES)
+        if i == 0:
+            # A same-day request whose START has a later time of day than its END; must not be rejected
+            end = start
+            start_text = start.isoformat() + 'T13:00:00.000Z'
+            end_text = start.strftime('%a %b %d %Y 08:00:00 GMT-0500')
+
+        if rng.random() < diamond_ratio:
+            vehicles = str(rng.randint(1, 10))
+        else:
+            vehicles = str(rng.randint(11, 200))
+        if rng.random() < 0.01:
+            vehicles = rng.choice(['', 'abc', 'ten'])  # rejected by validation
+
+        recipient = rng.randrange(recipients)
+        yield [
+            'TRUE' if rng.random() < generate_ratio else 'FALSE',
+            100000 + i,
+            f"Guest{recipient}",
+            f"Person{recipient}",
+            f"guest{recipient}@nd.edu",
+            rng.choice(DEPARTMENTS),
+            start_text,
+            end_text,
+            vehicles,
+            rng.choice(LOTS) if rng.random() < 0.25 else '',
+            f"PM{rng.randrange(10 ** 6):06d}",
+            rng.choice(EVENTS) if rng.random() < 0.8 else '',
+            start.isoformat(),
+            'Synthetic benchmark row'
+        ]
+
+
+def generate_master_file(path, rows, **options):
+    """Write a synthetic master file with `rows` rows to `path`; options go to synthetic_rows()"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(synthetic_rows(rows, **options))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--diamond-ratio', type=float, default=0.7)
+    parser.add_argument('--invalid-ratio', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate_master_file(args.output, args.rows, diamond_ratio=args.diamond_ratio,
+                         invalid_ratio=args.invalid_ratio, seed=args.seed)
+    print(f"Wrote {args.rows} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
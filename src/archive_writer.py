@@ -0,0 +1,48 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def write_file_atomic(path, data):
+    """Write `data` to `path` via a temporary file, so readers never see a partial PDF"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class ArchiveWriter:
+    """Writes the archival copies of in-memory PDFs on background threads
+
+    Sending doesn't wait for the (possibly slow, network) disk write;
+    close() waits for every write to finish.
+    """
+
+    def __init__(self, workers=2):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='archive')
+        self.written = 0
+        self.failed = []
+        self.lock = threading.Lock()
+
+    def write(self, path, data, on_written=None):
+        """Queue `data` to be written to `path`; `on_written()` runs once it is safely on disk"""
+        future = self.executor.submit(write_file_atomic, path, data)
+
+        def done(future):
+            error = future.exception()
+            with self.lock:
+                if error is None:
+                    self.written += 1
+                else:
+                    self.failed.append((path, error))
+            if error is not None:
+                print(f"Error writing PDF {path}: {error}")
+            elif on_written:
+                on_written()
+
+        future.add_done_callback(done)
+        return future
+
+    def close(self):
+        self.executor.shutdown(wait=True)
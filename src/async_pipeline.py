@@ -0,0 +1,161 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from tqdm import tqdm
+from digest import digest_groups
+from send_retry import SendFailure
+
+# Marks the end of a stage's input
+DONE = object()
+
+
+async def _plan_stage(run, chunks, render_queue, send_queue, progress):
+    """Read and plan each chunk, then route every job to the render or send queue
+
+    Returns the ParserError that stopped the reading early, if any, so the
+    jobs already planned still go through before it is raised.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                df = await loop.run_in_executor(None, next, chunks, None)
+            except pd.errors.ParserError as e:
+                return e
+            if df is None:
+                return None
+
+            jobs = await loop.run_in_executor(None, run.plan, df)
+            for job in jobs:
+                progress.update(1)
+                try:
+                    step = run.prepare(job)
+                except Exception as e:
+                    run.record_error(job, e)
+                    continue
+                # put() waits while a queue is full, so planning never runs far ahead of rendering/sending
+                if step == 'render':
+                    await render_queue.put(job)
+                elif step == 'send':
+                    await send_queue.put(job)
+    finally:
+        await render_queue.put(DONE)
+
+
+async def _render_stage(run, render_queue, send_queue, max_in_flight):
+    """Batch jobs from the render queue onto the render pool and forward finished passes"""
+    loop = asyncio.get_running_loop()
+    batch_size = max(1, run.args.batch_size)
+    slots = asyncio.Semaphore(max_in_flight)
+    in_flight = set()
+
+    async def render_batch(batch):
+        try:
+            try:
+                result = await loop.run_in_executor(
+                    run.render_pool.executor, run.render_pool.render,
+                    run.render_items(batch),
+                    run.javascript_delay, run.args.backend, run.args.render_profile
+                )
+            except Exception as e:
+                print(f"Error generating PDF: {e}")
+                result = None
+            for job in run.record_render_batch(batch, result):
+                await send_queue.put(job)
+        finally:
+            slots.release()
+
+    finished = False
+    while not finished:
+        job = await render_queue.get()
+        if job is DONE:
+            break
+        batch = [job]
+        # Top up the batch with whatever else is already waiting
+        while len(batch) < batch_size and not render_queue.empty():
+            job = render_queue.get_nowait()
+            if job is DONE:
+                finished = True
+                break
+            batch.append(job)
+
+        await slots.acquire()
+        task = asyncio.create_task(render_batch(batch))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    if run.render_cache:
+        run.render_cache.save()
+
+
+async def _send_worker(run, send_queue, executor, progress, send, record):
+    """Send each job (or digest group) from the queue on the executor and record the result"""
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await send_queue.get()
+        if item is DONE:
+            return
+        try:
+            message = await loop.run_in_executor(executor, send, item)
+        except Exception as e:
+            print(f"Error sending email: {e}")
+            message = SendFailure(e)
+        record(item, message)
+        progress.update(1)
+
+
+async def _collect(queue):
+    """Take jobs from a queue until DONE"""
+    items = []
+    while True:
+        item = await queue.get()
+        if item is DONE:
+            return items
+        items.append(item)
+
+
+async def run_pipeline(run, chunks, queue_size=100):
+    """Plan, render and send concurrently, connected by bounded queues
+
+    Rendering runs on the render pool's processes and sending on a thread
+    pool, so a run takes about as long as its slowest stage rather than the
+    sum of all of them. All ledger and tally updates happen on the event
+    loop thread. With --digest, ready jobs are collected until rendering
+    finishes and then sent as one email per recipient. A ParserError while
+    reading the master file is raised once the jobs planned before it are done.
+    """
+    render_queue = asyncio.Queue(maxsize=queue_size)
+    send_queue = asyncio.Queue(maxsize=queue_size)
+    workers = max(1, run.args.send_workers)
+    max_in_flight = run.render_pool.workers * 2
+
+    with tqdm(desc="Planning rows") as planned, tqdm(desc="Sending emails") as sent, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        if run.args.digest:
+            collector = asyncio.create_task(_collect(send_queue))
+        else:
+            senders = [asyncio.create_task(_send_worker(run, send_queue, executor, sent, run.send, run.record_send))
+                       for _ in range(workers)]
+        read_error, _ = await asyncio.gather(
+            _plan_stage(run, chunks, render_queue, send_queue, planned),
+            _render_stage(run, render_queue, send_queue, max_in_flight)
+        )
+
+        if run.args.digest:
+            await send_queue.put(DONE)
+            groups = digest_groups(await collector)
+            send_queue = asyncio.Queue()
+            for group in groups:
+                send_queue.put_nowait(group)
+            senders = [asyncio.create_task(_send_worker(run, send_queue, executor, sent, run.send_digest,
+                                                        run.record_digest_send))
+                       for _ in range(workers)]
+
+        for _ in senders:
+            await send_queue.put(DONE)
+        await asyncio.gather(*senders)
+
+    if read_error is not None:
+        raise read_error
@@ -0,0 +1,67 @@
+import os
+import re
+
+# Gmail rejects messages larger than 25 MB, counting attachments after MIME encoding
+GMAIL_MAX_MESSAGE_BYTES = 25 * 1024 * 1024
+
+# Headers, MIME boundaries and the inline ParkMobile image, per message
+MESSAGE_OVERHEAD_BYTES = 64 * 1024
+
+STYLE_PATTERN = re.compile(r'<style[^>]*>(.*?)</style>', re.S | re.I)
+BODY_PATTERN = re.compile(r'<body[^>]*>(.*)</body>', re.S | re.I)
+
+SECTION_SEPARATOR = '<hr style="border: 0; border-top: 3px solid #0c2340; margin: 40px 0;">'
+
+
+def estimated_size(job):
+    """Roughly how many bytes a pass adds to a message: its HTML plus its base64-encoded PDF"""
+    size = len(job.body or '')
+    if job.pdf_data is not None:
+        size += len(job.pdf_data) * 4 // 3
+    elif job.pdf_path and os.path.exists(job.pdf_path):
+        size += os.path.getsize(job.pdf_path) * 4 // 3
+    return size
+
+
+def digest_groups(jobs, max_bytes=GMAIL_MAX_MESSAGE_BYTES):
+    """Group jobs by recipient, in order, splitting a recipient's passes only where a message would get too big"""
+    by_email = {}
+    for job in jobs:
+        by_email.setdefault(str(job.email).strip().lower(), []).append(job)
+
+    groups = []
+    for recipient_jobs in by_email.values():
+        group, size = [], MESSAGE_OVERHEAD_BYTES
+        for job in recipient_jobs:
+            job_size = estimated_size(job)
+            if group and size + job_size > max_bytes:
+                groups.append(group)
+                group, size = [], MESSAGE_OVERHEAD_BYTES
+            group.append(job)
+            size += job_size
+        groups.append(group)
+    return groups
+
+
+def digest_subject(group):
+    from planning import DIGEST_SUBJECT
+    return group[0].subject if len(group) == 1 else f"{DIGEST_SUBJECT} ({len(group)})"
+
+
+def combine_email_bodies(bodies):
+    """Merge several HTML email bodies into one: every distinct <style> block, then each body in turn"""
+    if len(bodies) == 1:
+        return bodies[0]
+
+    styles = []
+    sections = []
+    for body in bodies:
+        for style in STYLE_PATTERN.findall(body):
+            if style not in styles:
+                styles.append(style)
+        match = BODY_PATTERN.search(body)
+        sections.append(match.group(1) if match else body)
+
+    intro = f'<p style="font-size: 1.1em;">This email contains <strong>{len(bodies)} parking passes</strong>.</p>'
+    return (f"<html><head><style>{''.join(styles)}</style></head><body>{intro}"
+            f"{SECTION_SEPARATOR.join(sections)}</body></html>")
@@ -0,0 +1,108 @@
+import argparse
+import os
+import threading
+from generate_guest_passes import create_gmail_sender, LEDGER_FILE, LEDGER_JOURNAL_MODE, OUTBOX_DIR
+from outbox import Outbox
+from rate_limit import TokenBucket, GMAIL_USER_QUOTA_UNITS_PER_SECOND
+from send_ledger import SendLedger
+from send_stage import run_send_stage
+from send_retry import SendFailure, AUTH, PERMANENT
+
+
+def parse_args(argv=None):
+    """Parse command line options; defaults can also be set in the .env file"""
+    parser = argparse.ArgumentParser(description="Send the emails spooled by generate_guest_passes.py --spool")
+    parser.add_argument('--outbox-dir', default=os.getenv('OUTBOX_DIR', OUTBOX_DIR),
+                        help="Maildir-style outbox to send from")
+    parser.add_argument('--send-workers', type=int, default=int(os.getenv('SEND_WORKERS', 4)),
+                        help="Number of emails to send in parallel")
+    parser.add_argument('--quota-units-per-second', type=float,
+                        default=float(os.getenv('GMAIL_QUOTA_UNITS_PER_SECOND', GMAIL_USER_QUOTA_UNITS_PER_SECOND)),
+                        help="Gmail per-user quota budget for the send rate limiter")
+    parser.add_argument('--requeue-failed', action='store_true',
+                        help="Move messages that failed to send last time back into the outbox first")
+    parser.add_argument('--no-ledger', action='store_true',
+                        default=os.getenv('NO_LEDGER', '').lower() in ('1', 'true', 'yes'),
+                        help="Don't record sends in the send ledger")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Send every message waiting in the outbox"""
+    args = parse_args(argv)
+    outbox = Outbox(args.outbox_dir)
+
+    if args.requeue_failed:
+        print(f"Requeued {outbox.requeue_failed()} failed message(s)")
+
+    pending = outbox.pending()
+    if not pending:
+        print("Outbox is empty")
+        return
+
+    sender = create_gmail_sender(rate_limiter=TokenBucket(args.quota_units_per_second))
+    if sender is None:
+        return
+    ledger = None if args.no_ledger else SendLedger(LEDGER_FILE, journal_mode=LEDGER_JOURNAL_MODE)
+
+    auth_failed = threading.Event()  # once Gmail rejects the sign-in, leave the rest for the next drain
+
+    def send_one(name):
+        if auth_failed.is_set() or not outbox.claim(name):
+            return None  # another drain is sending it, or left for the next drain after a sign-in error
+        data, passes = outbox.read(name)
+        try:
+            return sender.send_bytes(data), passes
+        except Exception as e:
+            print(f"Error sending {name}: {e}")
+            failure = SendFailure(e)
+            if failure.error_class == AUTH:
+                auth_failed.set()
+            return failure, passes
+
+    sent = failed = returned = 0
+    try:
+        for name, result in run_send_stage(send_one, pending, args.send_workers):
+            if result is None:
+                continue
+            if not isinstance(result, tuple):  # raised before sending; the message stays in cur/
+                failed += 1
+                continue
+            message, passes = result
+            if message:
+                outbox.finish(name, 'sent')
+                sent += 1
+                status, error = 'sent', None
+            elif message.error_class == PERMANENT:
+                # failed/ is the outbox's dead-letter folder; --requeue-failed sends these again
+                outbox.finish(name, 'failed')
+                failed += 1
+                status, error = 'dead', str(message)
+            else:
+                # Transient or sign-in trouble: the next drain tries again, so the pass stays 'spooled'
+                outbox.release(name)
+                returned += 1
+                continue
+            if ledger:
+                for spooled in passes:
+                    ledger.record_send(spooled['pass_number'], spooled['row_hash'], status,
+                                       message_id=message.get('id') if message else None, error=error)
+    finally:
+        if ledger:
+            ledger.close()
+
+    counts = outbox.counts()
+    print("\nSummary:")
+    print(f"Emails sent: {sent}")
+    print(f"Emails failed: {failed} (retry with --requeue-failed)")
+    if returned:
+        print(f"Returned to the outbox after a temporary error: {returned}")
+    if auth_failed.is_set():
+        print("Gmail rejected the saved sign-in; sign in again and re-run the drain")
+    print(f"Still waiting in the outbox: {counts['new']}")
+    if counts['cur']:
+        print(f"Claimed but unfinished (in {os.path.join(args.outbox_dir, 'cur')}): {counts['cur']}")
+
+
+if __name__ == "__main__":
+    main()
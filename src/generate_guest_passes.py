@@ -1,20 +1,37 @@
-import pandas as pd
 import os
 from datetime import datetime
-import pdfkit
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
+import email.charset
+import re
 import pickle
-import base64
 import json
+import argparse
+import tempfile
+import itertools
+import io
+import time
+from contextlib import contextmanager, nullcontext
 from dotenv import load_dotenv
-from tqdm import tqdm
+from rate_limit import TokenBucket, GMAIL_USER_QUOTA_UNITS_PER_SECOND
+from send_stage import run_send_stage
+from render_pool import RenderPool, default_render_workers
+from template_cache import load_template, load_inline_image
+import pass_assets
+from pass_assets import (scaled_logo, RENDER_PROFILES, ND_LOGO_HEIGHT_INCHES, FOOTER_LOGO_HEIGHT_INCHES)
+from render_cache import RenderCache
+from send_ledger import SendLedger
+from archive_writer import ArchiveWriter
+from digest import digest_groups, digest_subject, combine_email_bodies
+from outbox import Outbox
+from sharding import ShardBoard, shard_rows, master_file_id, worker_id, merge_summaries, DEFAULT_LEASE_SECONDS
+from run_metrics import RunMetrics
+from send_retry import SendFailure, DeadLetterFile, retry_delay, TRANSIENT, AUTH, PERMANENT, MAX_SEND_ATTEMPTS
 
-load_dotenv()  # Load environment variables from .env file
+# pandas, pdfkit, pypdf, reportlab, tqdm and the Google client libraries are imported
+# where they are first needed, so a run with nothing to do starts (and exits) quickly.
+# `python benchmarks/bench_startup.py` shows what an import costs.
 
 # --- OAuth 2.0 Configuration ---
 SCOPES = [
@@ -26,11 +43,66 @@ SCOPES = [
 
 # Setup paths
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+load_dotenv(os.path.join(PROJECT_ROOT, '.env'))  # Load environment variables from .env file
 CREDENTIALS_DIR = os.path.join(PROJECT_ROOT, 'credentials')
 os.makedirs(CREDENTIALS_DIR, exist_ok=True)
 TOKEN_FILE = os.path.join(CREDENTIALS_DIR, 'token.pickle')
 ASSETS_DIR = os.path.join(PROJECT_ROOT, "assets")
 TEMPLATES_DIR = os.path.join(PROJECT_ROOT, "templates")
+PASS_TEMPLATE_PATH = os.path.join(TEMPLATES_DIR, "diamondPass.html")
+ND_LOGO_PATH = os.path.join(ASSETS_DIR, "NotreDameFightingIrish.png")
+FOOTER_LOGO_PATH = os.path.join(ASSETS_DIR, "A91waj2z0_18kacb_mug.png")
+PARKMOBILE_EMAIL_TEMPLATE_PATH = os.path.join(TEMPLATES_DIR, "parkmobileEmail.html")
+DIAMOND_EMAIL_TEMPLATE_PATH = os.path.join(TEMPLATES_DIR, "diamondEmail.html")
+PARKMOBILE_IMAGE_PATH = os.path.join(ASSETS_DIR, "image.png")
+LEDGER_FILE = os.getenv('LEDGER_FILE', os.path.join(PROJECT_ROOT, 'state', 'send_ledger.sqlite3'))
+# DELETE for a ledger on a shared drive, e.g. one used by --shards workers on several PCs
+LEDGER_JOURNAL_MODE = os.getenv('LEDGER_JOURNAL_MODE', 'WAL')
+METRICS_DIR = os.path.join(PROJECT_ROOT, 'state', 'metrics')
+OUTBOX_DIR = os.path.join(PROJECT_ROOT, 'state', 'outbox')
+REJECTED_REPORT = os.path.join(PROJECT_ROOT, 'state', 'rejected_rows.csv')
+DEAD_LETTER_FILE = os.path.join(PROJECT_ROOT, 'state', 'dead_letter.jsonl')
+PROFILE_DIR = os.path.join(PROJECT_ROOT, 'state', 'profile')
+SCALED_ASSETS_DIR = os.getenv('SCALED_ASSETS_DIR', os.path.join(PROJECT_ROOT, 'state', 'assets'))
+# native_pass.py draws the pass for the native backend; its code is part of the render cache key
+NATIVE_PASS_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'native_pass.py')
+WKHTMLTOPDF_PATH = os.getenv('WKHTMLTOPDF_PATH', r'C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe')
+
+# Date portion of JavaScript-style dates, e.g. "Thu Jan 30 2025 08:00:00 GMT-0500 (...)"
+JS_DATE_PATTERN = r'^[A-Za-z]{3},? (?P<month>[A-Za-z]{3}) (?P<day>\d{1,2}) (?P<year>\d{4})\b'
+
+# Master file columns the pipeline reads; everything else is skipped when parsing
+MASTER_FILE_COLUMNS = {'GENERATE', 'PASS #', 'FIRST_NAME', 'EMAIL', 'DEPARTMENT', 'START', 'END',
+                       'VEHICLE_COUNT', 'ADD LOT', 'PARKMOBILE', 'EVENT'}
+# Read as text, exactly as written: a blank cell would otherwise turn a column of numbers into floats
+# (1003 -> 1003.0) in some reads and not others, changing the ledger's PASS # keys and row hashes
+TEXT_COLUMNS = MASTER_FILE_COLUMNS - {'GENERATE', 'VEHICLE_COUNT'}
+
+# Images email bodies may reference as cid:<content id>, attached as inline parts
+PARKMOBILE_IMAGE_CID = "parkmobile-image"
+INLINE_IMAGES = {PARKMOBILE_IMAGE_CID: PARKMOBILE_IMAGE_PATH}
+CID_PATTERN = re.compile(r'src="cid:([^"]+)"')
+
+# Quoted-printable keeps the mostly-ASCII HTML bodies close to their original size (base64 adds a third)
+HTML_CHARSET = email.charset.Charset('utf-8')
+HTML_CHARSET.body_encoding = email.charset.QP
+
+# Ledger setting naming the last master file a run finished without retryable failures
+FINISHED_MASTER_FILE_KEY = 'finished_master_file'
+
+# Index of rendered PDFs, kept alongside them in the Diamond Passes folder
+RENDER_CACHE_INDEX = ".render_cache.json"
+
+# Page breaks between passes when several are rendered in one document
+BATCH_PAGE_STYLE = """<style>
+      body { display: block; min-height: 0; }
+      .batch-page { page-break-after: always; }
+      .batch-page:last-child { page-break-after: auto; }
+    </style>
+"""
+
+# Built once per process (including each render pool worker) by get_pdfkit_config()
+_pdfkit_config = None
 
 def authenticate_gmail():
     """Authenticate with Gmail API and return credentials"""
@@ -45,6 +117,7 @@ def authenticate_gmail():
 
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
+            from google.auth.transport.requests import Request
             try:
                 creds.refresh(Request())
             except Exception as e:
@@ -70,6 +143,7 @@ def authenticate_gmail():
                 json.dump(credentials_dict, f)
             
             try:
+                from google_auth_oauthlib.flow import InstalledAppFlow
                 flow = InstalledAppFlow.from_client_secrets_file(
                     temp_creds_file, SCOPES)
                 creds = flow.run_local_server(port=0)
@@ -87,142 +161,202 @@ def authenticate_gmail():
 
     return creds
 
-def generate_email(to_email, subject, body, pdf_path=None):
-    """Send an email with optional PDF attachment"""
+def create_gmail_sender(rate_limiter=None, metrics=None):
+    """Authenticate once and return a GmailSender to reuse for the whole run"""
     creds = authenticate_gmail()
     if not creds:
         print("Failed to authenticate with Gmail")
-        return False
-        
-    try:
-        # Build the service with delegation
-        delegate_email = os.getenv('GMAIL_DELEGATE_EMAIL', 'parking@nd.edu')
-        service = build('gmail', 'v1', credentials=creds)
-        
-        # Set up delegation
-        try:
-            service._http.credentials._delegate = delegate_email
-        except Exception as e:
-            print(f"Error setting up delegation: {e}")
-            return False
+        return None
 
+    try:
+        from gmail_sender import GmailSender
+        return GmailSender(creds, token_file=TOKEN_FILE, rate_limiter=rate_limiter, metrics=metrics)
     except Exception as e:
         print(f"Error building Gmail service: {e}")
-        return False
+        return None
 
+def build_email_message(from_email, to_email, subject, body, pdf_path=None, metrics=None, pdf_data=None,
+                        attachments=None):
+    """Assemble the MIME message for an email with optional PDF attachment
+
+    Images the body references as `cid:` are attached as inline parts that
+    are encoded once and shared by every message. If the PDF is already in
+    memory, pass its bytes as `pdf_data`; `pdf_path` then only names the
+    attachment. `attachments` is a list of further `(pdf_path, pdf_data)`
+    pairs, for emails that carry several passes.
+    """
+    start = time.perf_counter()
     msg = MIMEMultipart()
-    msg['From'] = delegate_email
+    msg['From'] = from_email
     msg['To'] = to_email
     msg['Subject'] = subject
 
-    msg.attach(MIMEText(body, 'html'))
+    html_part = MIMEText(body, 'html', HTML_CHARSET)
+    content_ids = set(CID_PATTERN.findall(body))
+    if content_ids:
+        # multipart/related keeps the images with the HTML that references them
+        related = MIMEMultipart('related')
+        related.attach(html_part)
+        for content_id in sorted(content_ids):
+            if content_id in INLINE_IMAGES:
+                related.attach(load_inline_image(INLINE_IMAGES[content_id], content_id))
+        msg.attach(related)
+    else:
+        msg.attach(html_part)
 
-    if pdf_path and os.path.exists(pdf_path):
+    for pdf_path, pdf_data in [(pdf_path, pdf_data), *(attachments or [])]:
+        if not pdf_path or (pdf_data is None and not os.path.exists(pdf_path)):
+            continue
         try:
-            with open(pdf_path, "rb") as attachment:
-                part = MIMEApplication(attachment.read(), Name=os.path.basename(pdf_path))
-                part['Content-Disposition'] = f'attachment; filename="{os.path.basename(pdf_path)}"'
-                msg.attach(part)
+            if pdf_data is None:
+                with open(pdf_path, "rb") as attachment:
+                    pdf_data = attachment.read()
+            part = MIMEApplication(pdf_data, Name=os.path.basename(pdf_path))
+            part['Content-Disposition'] = f'attachment; filename="{os.path.basename(pdf_path)}"'
+            msg.attach(part)
+            if metrics:
+                metrics.count('attachment_bytes_total', len(pdf_data))
         except Exception as e:
             print(f"Error attaching PDF: {e}")
 
+    if metrics:
+        metrics.observe('mime_build', time.perf_counter() - start)
+    return msg
+
+def generate_email(to_email, subject, body, pdf_path=None, sender=None, metrics=None, pdf_data=None,
+                   attachments=None):
+    """Send an email with optional PDF attachment
+
+    Returns the Gmail API response, or a (falsy) SendFailure saying what
+    went wrong and whether retrying later can help.
+    """
+    if sender is None:
+        sender = create_gmail_sender(metrics=metrics)
+        if sender is None:
+            return False
+
+    msg = build_email_message(sender.delegate_email, to_email, subject, body, pdf_path, metrics, pdf_data,
+                              attachments)
     try:
-        raw = base64.urlsafe_b64encode(msg.as_bytes()).decode()
-        raw_message = {'raw': raw}
-        
-        # Send the message
-        message = service.users().messages().send(
-            userId='me',  # Use 'me' since we're already delegated
-            body=raw_message
-        ).execute()
-            
-        return message
+        return sender.send(msg)
     except Exception as e:
         error_details = getattr(e, 'details', str(e))
         print(f"Error sending email: {e}")
         print(f"Error details: {error_details}")
-        
-        if "OAuth" in str(e) or "client" in str(e) or "credential" in str(e):
-            if os.path.exists(TOKEN_FILE):
-                print("Deleting token file to force reauthentication")
-                os.remove(TOKEN_FILE)
-        return False
+        return SendFailure(e)
 
-def generate_diamond_pass_pdf(data, output_path="diamondPass.pdf"):
-    """Generate a PDF parking pass from HTML template"""
-    template_path = os.path.join(TEMPLATES_DIR, "diamondPass.html")
-    nd_logo_path = os.path.join(ASSETS_DIR, "NotreDameFightingIrish.png")
-    footer_logo_path = os.path.join(ASSETS_DIR, "A91waj2z0_18kacb_mug.png")
-    
+def get_pdfkit_config():
+    """Return this process's pdfkit configuration, building it on first use"""
+    global _pdfkit_config
+    if _pdfkit_config is None:
+        import pdfkit
+        _pdfkit_config = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH)
+    return _pdfkit_config
+
+def pass_logo_paths(profile='print'):
+    """The ND and footer logo files to render passes with under a render profile"""
+    logo_dpi = RENDER_PROFILES[profile]['logo_dpi']
+    if logo_dpi is None:
+        return ND_LOGO_PATH, FOOTER_LOGO_PATH
+    return (scaled_logo(ND_LOGO_PATH, ND_LOGO_HEIGHT_INCHES, logo_dpi, SCALED_ASSETS_DIR),
+            scaled_logo(FOOTER_LOGO_PATH, FOOTER_LOGO_HEIGHT_INCHES, logo_dpi, SCALED_ASSETS_DIR))
+
+def render_pass_html(data, profile='print'):
+    """Fill the Diamond Pass HTML template for one pass; returns None if files are missing"""
+    # Template and base64 images are loaded once per process and reloaded if the files change
     try:
-        with open(template_path, "r") as f:
-            html_template = f.read()
-    except FileNotFoundError:
-        print(f"Error: Template file not found at {template_path}")
+        nd_logo_path, footer_logo_path = pass_logo_paths(profile)
+        template = load_template(PASS_TEMPLATE_PATH, {
+            'src="NotreDameFightingIrish.png"': nd_logo_path,
+            'src="A91waj2z0_18kacb_mug.png"': footer_logo_path
+        })
+    except FileNotFoundError as e:
+        if e.filename == PASS_TEMPLATE_PATH:
+            print(f"Error: Template file not found at {PASS_TEMPLATE_PATH}")
+        else:
+            print(f"\nError: Required image files are missing! {e}")
         return None
 
-    # Replace template variables
-    replacements = {
-        "{{academic_year_start}}": str(data.get('ACADEMIC_YEAR_START', '')),
-        "{{academic_year_end}}": str(data.get('ACADEMIC_YEAR_END', '')),
-        "{{pass_type}}": str(data.get('PASS_TYPE', 'UNIVERSITY OF NOTRE DAME')),
-        "{{parking_type}}": str(data.get('PARKING_TYPE', 'GUEST PARKING PASS')),
-        "{{valid_until}}": str(data.get('VALID_UNTIL', '')),
-        "{{lot_name}}": str(data.get('LOT', 'C LOT')),
-        "{{add_lot}}": str(data.get('ADD LOT', '')),
-        "{{pass_number}}": str(data.get('PASS_NUMBER', ''))
+    # Fill template variables
+    return template.render({
+        "academic_year_start": str(data.get('ACADEMIC_YEAR_START', '')),
+        "academic_year_end": str(data.get('ACADEMIC_YEAR_END', '')),
+        "pass_type": str(data.get('PASS_TYPE', 'UNIVERSITY OF NOTRE DAME')),
+        "parking_type": str(data.get('PARKING_TYPE', 'GUEST PARKING PASS')),
+        "valid_until": str(data.get('VALID_UNTIL', '')),
+        "lot_name": str(data.get('LOT', 'C LOT')),
+        "add_lot": str(data.get('ADD LOT', '')),
+        "pass_number": str(data.get('PASS_NUMBER', ''))
+    })
+
+def pdfkit_options(javascript_delay=1000, profile='print'):
+    """wkhtmltopdf options for Diamond Passes"""
+    options = {
+        'enable-local-file-access': None,
+        'quiet': '',
+        'page-size': 'Letter',
+        'margin-top': '0mm',
+        'margin-right': '0mm',
+        'margin-bottom': '0mm',
+        'margin-left': '0mm',
+        'encoding': 'UTF-8',
+        'no-outline': None,
+        'enable-smart-shrinking': None,
+        'zoom': '1.0'
     }
-    
-    html_content = html_template
-    for key, value in replacements.items():
-        html_content = html_content.replace(key, value)
+    options.update(RENDER_PROFILES[profile]['pdfkit'])
+    if javascript_delay:
+        options['javascript-delay'] = str(javascript_delay)
+    else:
+        options['disable-javascript'] = None
+    return options
 
-    # Embed images as base64
+def generate_diamond_pass_pdf_native(data, output_path="diamondPass.pdf", profile='print'):
+    """Draw a PDF parking pass directly with reportlab, without wkhtmltopdf"""
     try:
-        # Load and encode images
-        images = {
-            'src="NotreDameFightingIrish.png"': nd_logo_path,
-            'src="A91waj2z0_18kacb_mug.png"': footer_logo_path
-        }
-        
-        for img_src, img_path in images.items():
-            with open(img_path, "rb") as img_file:
-                img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
-                html_content = html_content.replace(
-                    img_src,
-                    f'src="data:image/png;base64,{img_base64}"'
-                )
+        from native_pass import generate_native_pass_pdf
+        nd_logo_path, footer_logo_path = pass_logo_paths(profile)
+        return generate_native_pass_pdf(data, output_path, nd_logo_path, footer_logo_path,
+                                        ascii85=RENDER_PROFILES[profile]['ascii85'])
     except FileNotFoundError as e:
         print(f"\nError: Required image files are missing! {e}")
         return None
+    except Exception as e:
+        print(f"Error generating PDF: {e}")
+        return None
+
+def generate_diamond_pass_pdf(data, output_path="diamondPass.pdf", javascript_delay=1000, backend='html',
+                              profile='print'):
+    """Generate a PDF parking pass from HTML template
+
+    The template is static HTML, so `javascript_delay` (milliseconds) can be
+    set to 0 to skip waiting on scripts. `backend='native'` draws the pass
+    with reportlab instead of rendering the HTML. With `output_path=None`
+    nothing is written to disk and the PDF's bytes are returned instead.
+    `profile` is a key of RENDER_PROFILES.
+    """
+    if backend == 'native':
+        return generate_diamond_pass_pdf_native(data, output_path, profile)
+
+    html_content = render_pass_html(data, profile)
+    if html_content is None:
+        return None
     
+    import pdfkit
     try:
-        config = pdfkit.configuration(wkhtmltopdf=r'C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe')
-        
-        options = {
-            'enable-local-file-access': None,
-            'quiet': '',
-            'page-size': 'Letter',
-            'margin-top': '0mm',
-            'margin-right': '0mm',
-            'margin-bottom': '0mm',
-            'margin-left': '0mm',
-            'encoding': 'UTF-8',
-            'no-outline': None,
-            'dpi': '300',
-            'image-quality': '100',
-            'enable-smart-shrinking': None,
-            'zoom': '1.0',
-            'javascript-delay': '1000'
-        }
-        
+        if output_path is None:
+            # False tells pdfkit to return the PDF instead of writing a file
+            pdf = pdfkit.from_string(html_content, False, configuration=get_pdfkit_config(),
+                                     options=pdfkit_options(javascript_delay, profile))
+            return pdf or None
+
         os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
         
         pdfkit.from_string(
             html_content, 
             output_path, 
-            configuration=config,
-            options=options
+            configuration=get_pdfkit_config(),
+            options=pdfkit_options(javascript_delay, profile)
         )
         
         return output_path if os.path.exists(output_path) else None
@@ -231,8 +365,88 @@ def generate_diamond_pass_pdf(data, output_path="diamondPass.pdf"):
         print(f"Error generating PDF: {e}")
         return None
 
+def generate_diamond_pass_pdf_batch(items, javascript_delay=1000, backend='html', profile='print'):
+    """Render many passes with one wkhtmltopdf call and split the result per pass
+
+    `items` is a list of `(data, output_path)` pairs. Returns the output
+    paths in the same order (None for a pass that failed), or the PDF's
+    bytes for an item whose output_path is None. If the combined
+    document does not come back with exactly one page per pass, each pass is
+    rendered on its own instead. The native backend has no engine start-up
+    to amortize, so it simply draws each pass in turn.
+    """
+    if backend == 'native':
+        return [generate_diamond_pass_pdf_native(data, output_path, profile) for data, output_path in items]
+    if len(items) == 1:
+        return [generate_diamond_pass_pdf(items[0][0], items[0][1], javascript_delay, profile=profile)]
+
+    pages = []
+    head = None
+    for data, output_path in items:
+        html_content = render_pass_html(data, profile)
+        if html_content is None:
+            return [None] * len(items)
+        before_body, body = html_content.split('<body>', 1)
+        head = head or before_body
+        pages.append(f'<div class="batch-page">{body.rsplit("</body>", 1)[0]}</div>')
+
+    import pdfkit
+    from pypdf import PdfReader, PdfWriter
+
+    # One pass per printed page
+    head = head.replace('</head>', BATCH_PAGE_STYLE + '</head>', 1)
+    html_content = f"{head}<body>{''.join(pages)}</body></html>"
+
+    fd, batch_path = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+    try:
+        pdfkit.from_string(
+            html_content,
+            batch_path,
+            configuration=get_pdfkit_config(),
+            options=pdfkit_options(javascript_delay, profile)
+        )
+        reader = PdfReader(batch_path)
+        if len(reader.pages) != len(items):
+            print(f"Warning: batch of {len(items)} passes rendered {len(reader.pages)} pages; rendering individually")
+            return [generate_diamond_pass_pdf(data, output_path, javascript_delay, profile=profile)
+                    for data, output_path in items]
+
+        paths = []
+        for page, (data, output_path) in zip(reader.pages, items):
+            try:
+                writer = PdfWriter()
+                writer.add_page(page)
+                if output_path is None:
+                    buffer = io.BytesIO()
+                    writer.write(buffer)
+                    paths.append(buffer.getvalue())
+                    continue
+                os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+                with open(output_path, 'wb') as f:
+                    writer.write(f)
+                paths.append(output_path)
+            except Exception as e:
+                print(f"Error writing PDF {output_path}: {e}")
+                paths.append(None)
+        return paths
+
+    except Exception as e:
+        print(f"Error generating PDF batch: {e}")
+        return [None] * len(items)
+    finally:
+        if os.path.exists(batch_path):
+            os.remove(batch_path)
+
+def render_pass_batch(items, javascript_delay=1000, backend='html', profile='print'):
+    """Render pool entry point: generate_diamond_pass_pdf_batch() plus how many seconds it took"""
+    start = time.perf_counter()
+    pdf_paths = generate_diamond_pass_pdf_batch(items, javascript_delay, backend, profile)
+    return pdf_paths, time.perf_counter() - start
+
 def parse_date(date_str):
     """Parse different date formats and return pandas Timestamp"""
+    import pandas as pd
     try:
         # If it's already a pandas Timestamp
         if isinstance(date_str, pd.Timestamp):
@@ -261,6 +475,60 @@ def parse_date(date_str):
         print(f"Warning: Could not parse date '{date_str}'. Error: {e}")
         return None
 
+def _parse_date_values(values):
+    """Parse distinct raw date values in bulk; returns {value: Timestamp or NaT}"""
+    import pandas as pd
+    strings = pd.Series([str(value) for value in values], dtype=object)
+    result = pd.Series(pd.NaT, index=strings.index, dtype='datetime64[ns]')
+
+    # JavaScript dates like "Thu Jan 30 2025 08:00:00 GMT-0500 (...)": keep the date portion
+    js_parts = strings.str.extract(JS_DATE_PATTERN)
+    is_js = js_parts['month'].notna()
+    if is_js.any():
+        js_dates = js_parts.loc[is_js, 'month'] + ' ' + js_parts.loc[is_js, 'day'] + ' ' + js_parts.loc[is_js, 'year']
+        result[is_js] = pd.to_datetime(js_dates, format='%b %d %Y', errors='coerce')
+
+    # Everything else (ISO, m/d/Y, ...) in one call, keeping local wall-clock time
+    others = strings[~is_js].str.split('GMT').str[0].str.strip()
+    if len(others):
+        try:
+            parsed = pd.to_datetime(others, format='mixed', errors='coerce')
+            if parsed.dt.tz is not None:
+                parsed = parsed.dt.tz_localize(None)
+        except (ValueError, TypeError):
+            # Mixed time zone offsets can't share one dtype; fall back to value by value
+            parsed = pd.Series([_parse_single_date(value) for value in others], index=others.index)
+        result[~is_js] = pd.to_datetime(parsed)
+
+    return dict(zip(values, result))
+
+def _parse_single_date(value):
+    import pandas as pd
+    parsed = pd.to_datetime(value, errors='coerce')
+    if parsed is not pd.NaT and parsed.tzinfo is not None:
+        parsed = parsed.tz_localize(None)
+    return parsed
+
+def parse_date_columns(df, columns=('START', 'END')):
+    """Parse whole date columns in one pass
+
+    Adds a `<column>_DATE` datetime column for each of `columns` and returns
+    a boolean mask of rows where any of them could not be parsed. Each
+    distinct value is parsed only once.
+    """
+    import pandas as pd
+    parsed_values = {}
+    invalid = pd.Series(False, index=df.index)
+    for column in columns:
+        raw = df[column]
+        new_values = [value for value in pd.unique(raw.dropna()) if value not in parsed_values]
+        if new_values:
+            parsed_values.update(_parse_date_values(new_values))
+        parsed = pd.to_datetime(raw.map(parsed_values))
+        df[f"{column}_DATE"] = parsed
+        invalid |= parsed.isna()
+    return invalid
+
 def format_date_range(start_date, end_date):
     """Format date range for VALID_UNTIL field"""
     start = parse_date(start_date)
@@ -286,285 +554,769 @@ def format_email_date_range(start_date, end_date):
         return format_email_date(start_date)
     return f"{format_email_date(start_date)} - {format_email_date(end_date)}"
 
-def generate_parkmobile_email_body(row, start_date, end_date):
+def generate_parkmobile_email_body(row, start_date, end_date, minify=True):
     """Generate email body for ParkMobile access code"""
-    
-    # Get ParkMobile image
-    try:
-        image_path = os.path.join(ASSETS_DIR, "image.png")
-        with open(image_path, "rb") as img_file:
-            image_base64 = base64.b64encode(img_file.read()).decode('utf-8')
-    except Exception as e:
-        print(f"Warning: Could not load ParkMobile image: {e}")
-        image_base64 = None
-
-    # Get the current date
-    email_generated_date = datetime.now().strftime('%B %d, %Y')
-
-    return f"""<html>
-    <head>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                line-height: 1.8;
-                color: #333;
-                max-width: 600px;
-                margin: 0 auto;
-                padding: 20px;
-                font-size: 16px;
-                background-color: #ffffff;
-            }}
-            .email-container {{ width: 100%; max-width: 600px; margin: 0 auto; }}
-            .info-box {{
-                margin: 20px 0;
-                padding: 20px;
-                background-color: #f8f9fa;
-                border-radius: 8px;
-                box-shadow: 0 2px 4px rgba(12, 35, 64, 0.1);
-            }}
-            .access-code {{
-                font-size: 1.6em;
-                color: #0c2340;
-                font-weight: bold;
-                background-color: #e9ecef;
-                padding: 15px;
-                border-radius: 8px;
-                display: inline-block;
-                width: auto;
-                min-width: 100px;
-                max-width: 80%;
-                margin: 15px 0;
-                text-align: left;
-                border: 2px dashed #0c2340;
-                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            }}
-            .warning-box {{
-                margin: 20px 0;
-                padding: 20px;
-                background-color: #fff3cd;
-                border-left: 6px solid #ffc107;
-                color: #856404;
-                font-size: 1.1em;
-                border-radius: 8px;
-            }}
-            .charge-notice {{
-                margin: 20px 0;
-                padding: 15px;
-                background-color: #0c2340;
-                color: white;
-                border-radius: 8px;
-            }}
-            .signature {{
-                margin-top: 30px;
-                padding-top: 20px;
-                border-top: 1px solid #dee2e6;
-                color: #666;
-            }}
-            img {{
-                max-width: 100%;
-                margin: 20px 0;
-                border: 1px solid #ddd;
-                border-radius: 8px;
-                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            }}
-            ol li, ul li {{ margin-bottom: 12px; padding-left: 5px; }}
-            ol, ul {{ padding-left: 30px; }}
-            h3 {{
-                color: #0c2340;
-                margin-top: 25px;
-                margin-bottom: 15px;
-                font-size: 1.3em;
-            }}
-            .button {{
-                display: inline-block;
-                background-color: #0c2340;
-                color: white;
-                padding: 15px 30px;
-                text-decoration: none;
-                font-weight: bold;
-                border-radius: 8px;
-                margin: 20px 0;
-                font-size: 1.2em;
-                text-align: center;
-            }}
-            a {{
-                color: #0c2340;
-                text-decoration: underline;
-                font-weight: bold;
-            }}
-        </style>
-    </head>
-    <body>
-        <p>Greetings <span style="font-weight: bold; font-size: 1.1em;">{row['FIRST_NAME']},</span></p>
-
-        <div class="info-box">
-            <strong>Event:</strong> {row.get('EVENT', 'Event Name Not Provided')}<br>
-            <strong>Event Date:</strong> {format_email_date_range(start_date, end_date)}<br>
-            <strong>ParkMobile Access Code:</strong><br>
-            <div class="access-code">{row['PARKMOBILE']}</div>
-        </div>
-
-        <p>Your ParkMobile Access Code has been assigned! Please share this information with your guests. The Access Code may be used to reserve parking for the event date. This can be done prior to arriving at Notre Dame.</p>
-
-        <div class="warning-box">
-            <strong>Note:</strong> Please allow 1-2 business days from {email_generated_date} for the access code to become active in the ParkMobile app.
-        </div>
-        {f'<img src="data:image/png;base64,{image_base64}" alt="ParkMobile Interface">' if image_base64 else ''}
-        <div class="info-box">
-            <h3 style="color: #0c2340; margin-top: 0;">How to Use ParkMobile:</h3>
-            <p style="font-weight: bold; margin-bottom: 20px; font-size: 1.1em;">Follow these steps to reserve your parking spot:</p>
-            <ol style="padding-left: 20px;">
-                <li><span style="font-weight: bold;">FIRST:</span> Download the ParkMobile app on your phone* <strong>OR</strong> visit <a href="https://parkmobile.io" style="color: #0c2340; font-weight: bold; font-size: 1.1em;">ParkMobile.io</a></li>
-                <li><span style="font-weight: bold;">NEXT:</span> Your specific event will appear in a blue bar at the top of the screen</li>
-                <li><span style="font-weight: bold;">THEN:</span> Click "Filters & Access Codes" (located just below the blue bar)</li>
-                <li><span style="font-weight: bold;">ENTER THIS CODE:</span><br>
-                    <div class="access-code">{row['PARKMOBILE']}</div>
-                </li>
-                <li><span style="font-weight: bold;">CLICK:</span> "Apply" to unlock complimentary parking in available lots</li>
-                <li><span style="font-weight: bold;">SELECT:</span> Your preferred parking lot from the list</li>
-                <li><span style="font-weight: bold;">CLICK:</span> The green "Reserve" button</li>
-                <li><span style="font-weight: bold;">ENTER:</span> Your email address and vehicle license plate number</li>
-                <li><span style="font-weight: bold;">COMPLETE:</span> Follow the remaining prompts to finish your reservation</li>
-            </ol>
-            <p style="background-color: #e9ecef; padding: 10px; border-radius: 8px; margin-top: 20px;"><strong>Tip:</strong> <em>You can either continue as a guest or create an account for future use.</em></p>
-        </div>
-
-        <div class="warning-box" style="border: 3px solid #ffc107; text-align: center;">
-            <h3 style="color: #856404; margin-top: 0; font-size: 1.3em;">⚠️ IMPORTANT FOR ANDROID USERS ⚠️</h3>
-            <ul style="padding-left: 20px; text-align: left; list-style-type: none;">
-                <li style="margin-bottom: 5px;">📱 Android users MUST use the <a href="https://parkmobile.io" style="color: #856404; font-weight: bold; text-decoration: underline;">ParkMobile.io website</a> (not the app)</li>
-                <li style="margin-bottom: 5px;">❌ Access codes are NOT supported in the Android app</li>
-                <li style="margin-bottom: 5px;">✅ Once reserved, your parking will appear in your ParkMobile app account</li>
-            </ul>
-        </div>
-
-        <div class="info-box" style="border: 2px solid #0c2340;">
-            <h3 style="color: #0c2340; margin-top: 0; text-align: center; font-size: 1.4em;">📅 On the Day of Parking:</h3>
-            <ul style="padding-left: 20px;">
-                <li style="margin-bottom: 5px;">✅ <span style="font-weight: bold; font-size: 1.1em;">No physical parking pass needed</span></li>
-                <li style="margin-bottom: 5px;">✅ <span style="font-weight: bold; font-size: 1.1em;">NDPD Parking Enforcement will verify your parking using your license plate</span></li>
-                <li style="margin-bottom: 5px;">⚠️ <span style="font-weight: bold; font-size: 1.1em; color: #856404;">IMPORTANT: Make sure the license plate number is entered correctly</span></li>
-            </ul>
-        </div>
-
-        <div class="charge-notice">
-            <p style="margin: 0;"><strong>After the event, your departmental FOAPAL will be charged $5.50 for each use of the access code.</strong></p>
-        </div>
-
-        <p>We recommend testing the link and code yourself before sharing with guests, so you can assist if they have questions.</p>
-
-        <div class="signature">
-            <p style="font-size: 1.1em; margin-bottom: 5px;">Thank you,</p>
-            <p style="font-size: 1.2em; font-weight: bold; color: #0c2340; margin-top: 0;">NDPD Parking Services Team</p>
-            <hr style="border: 1px solid #dee2e6; margin: 15px 0;">
-            <p style="color: #666; font-size: 0.9em;">Pass Number: {row['PASS #']}</p>
-        </div>
-    </body>
-    </html>"""
-
-def generate_diamond_email_body(row, start_date, end_date):
+    template = load_template(PARKMOBILE_EMAIL_TEMPLATE_PATH, minify=minify)
+
+    # The ParkMobile screenshot is attached once as an inline part and referenced by cid:
+    image_tag = ''
+    if os.path.exists(PARKMOBILE_IMAGE_PATH):
+        image_tag = f'<img src="cid:{PARKMOBILE_IMAGE_CID}" alt="ParkMobile Interface">'
+    else:
+        print(f"Warning: Could not load ParkMobile image: {PARKMOBILE_IMAGE_PATH} not found")
+
+    return template.render({
+        'FIRST_NAME': str(row['FIRST_NAME']),
+        'EVENT': str(row.get('EVENT', 'Event Name Not Provided')),
+        'EVENT_DATE': format_email_date_range(start_date, end_date),
+        'PARKMOBILE': str(row['PARKMOBILE']),
+        'EMAIL_GENERATED_DATE': datetime.now().strftime('%B %d, %Y'),
+        'PARKMOBILE_IMAGE': image_tag,
+        'PASS_NUMBER': str(row['PASS #'])
+    })
+
+def generate_diamond_email_body(row, start_date, end_date, minify=True):
     """Generate email body for Diamond Pass emails"""
-    return f"""<html>
-    <head>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                line-height: 1.8;
-                color: #333;
-                max-width: 600px;
-                margin: 0 auto;
-                padding: 20px;
-                font-size: 16px;
-                background-color: #ffffff;
-            }}
-            .email-container {{ width: 100%; max-width: 600px; margin: 0 auto; }}
-            .date-box {{
-                margin: 20px 0;
-                padding: 20px;
-                background-color: #f8f9fa;
-                border-radius: 8px;
-                box-shadow: 0 2px 4px rgba(12, 35, 64, 0.1);
-                font-size: 1.1em;
-                border: 1px solid #dee2e6;
-            }}
-            .important-notice {{
-                margin: 20px 0;
-                padding: 15px;
-                background-color: #0c2340;
-                color: white;
-                border-radius: 8px;
-            }}
-            .contact-info {{
-                margin: 20px 0;
-                padding: 15px;
-                background-color: #e9ecef;
-                border-radius: 8px;
-            }}
-            .signature {{
-                margin-top: 30px;
-                padding-top: 20px;
-                border-top: 1px solid #dee2e6;
-                color: #666;
-            }}
-            .button {{
-                display: inline-block;
-                background-color: #0c2340;
-                color: white;
-                padding: 15px 30px;
-                text-decoration: none;
-                font-weight: bold;
-                border-radius: 8px;
-                margin: 20px 0;
-                font-size: 1.2em;
-                text-align: center;
-            }}
-            a {{ color: #0c2340; text-decoration: underline; font-weight: bold; }}
-        </style>
-    </head>
-    <body>
-        <p>Greetings <span style="font-weight: bold; font-size: 1.1em;">{row['FIRST_NAME']},</span></p>
-
-        <div class="date-box">
-            <h3 style="color: #0c2340; margin-top: 0; text-align: left;">📝 Guest Parking Pass Information</h3>
-            <p style="font-size: 1.1em;">A Guest Parking Pass PDF has been <span style="font-weight: bold; text-decoration: underline;">attached to this email</span> for use by your guest(s) on:</p>
-            <div style="font-size: 1.5em; color: #0c2340; font-weight: bold; background-color: #e9ecef; padding: 15px; border-radius: 8px; text-align: left; margin: 15px 0; border: 2px dashed #0c2340; display: inline-block; width: auto;">
-                {format_email_date_range(start_date, end_date)}
-            </div>
-        </div>
-
-        <div style="font-size: 1.1em; line-height: 1.8; margin: 25px 0; padding: 15px; background-color: #f8f9fa; border-radius: 8px;">
-            <p>📄 This PDF version of the Guest Parking Pass:</p>
-            <ul style="padding-left: 30px;">
-                <li>Should be <span style="font-weight: bold;">emailed to your guest(s)</span> before their visit</li>
-                <li>Must be <span style="font-weight: bold;">printed out</span> by your guest</li>
-                <li>Needs to be <span style="font-weight: bold;">placed on their vehicle's dashboard</span> while parked</li>
-                <li>Is <span style="font-weight: bold; color: #856404;">only valid for the date(s) shown on the pass</span></li>
-            </ul>
-        </div>
-
-        <div class="important-notice">
-            <p style="margin: 0; font-size: 1.1em;"><strong>⚠️ Important:</strong> The FOAPAL number provided will be charged for 
-            the number of guest passes requested after the usage date.</p>
-        </div>
-
-        <div class="contact-info" style="text-align: left;">
-            <h3 style="color: #0c2340;">Need Help?</h3>
-            <p style="font-size: 1.1em;">Contact our office at:</p>
-            <a href="tel:574-631-5053" class="button">📞 Call: 574-631-5053</a><br>
-            <a href="mailto:parking@nd.edu" class="button">✉️ Email: parking@nd.edu</a>
-        </div>
-
-        <div class="signature">
-            <p style="font-size: 1.1em; margin-bottom: 5px;">Thank you,</p>
-            <p style="font-size: 1.2em; font-weight: bold; color: #0c2340; margin-top: 0;">NDPD Parking Services Office</p>
-            <hr style="border: 1px solid #dee2e6; margin: 15px 0;">
-            <p style="color: #666; font-size: 0.9em;">Pass Number: {row['PASS #']}</p>
-        </div>
-    </body>
-    </html>"""
-
-def main():
+    template = load_template(DIAMOND_EMAIL_TEMPLATE_PATH, minify=minify)
+    return template.render({
+        'FIRST_NAME': str(row['FIRST_NAME']),
+        'EVENT_DATE': format_email_date_range(start_date, end_date),
+        'PASS_NUMBER': str(row['PASS #'])
+    })
+
+def parse_args(argv=None):
+    """Parse command line options; defaults can also be set in the .env file"""
+    parser = argparse.ArgumentParser(description="Generate and email department guest parking passes")
+    parser.add_argument('--send-workers', type=int, default=int(os.getenv('SEND_WORKERS', 4)),
+                        help="Number of emails to send in parallel")
+    parser.add_argument('--quota-units-per-second', type=float,
+                        default=float(os.getenv('GMAIL_QUOTA_UNITS_PER_SECOND', GMAIL_USER_QUOTA_UNITS_PER_SECOND)),
+                        help="Gmail per-user quota budget for the send rate limiter")
+    parser.add_argument('--render-workers', type=int,
+                        default=int(os.getenv('RENDER_WORKERS', default_render_workers())),
+                        help="Number of worker processes rendering Diamond Pass PDFs")
+    parser.add_argument('--no-javascript-delay', action='store_true',
+                        default=os.getenv('NO_JAVASCRIPT_DELAY', '').lower() in ('1', 'true', 'yes'),
+                        help="Skip wkhtmltopdf's JavaScript delay (the pass template is static HTML)")
+    parser.add_argument('--backend', choices=['html', 'native'], default=os.getenv('PASS_BACKEND', 'html'),
+                        help="Render passes with wkhtmltopdf ('html') or draw them directly with reportlab ('native')")
+    parser.add_argument('--render-profile', choices=list(RENDER_PROFILES), default=os.getenv('RENDER_PROFILE', 'print'),
+                        help="'print' embeds the logos at full resolution; 'compact' pre-scales them to their printed size for smaller PDFs")
+    parser.add_argument('--no-render-cache', action='store_true',
+                        default=os.getenv('NO_RENDER_CACHE', '').lower() in ('1', 'true', 'yes'),
+                        help="Render every Diamond Pass even if an identical PDF already exists")
+    parser.add_argument('--no-ledger', action='store_true',
+                        default=os.getenv('NO_LEDGER', '').lower() in ('1', 'true', 'yes'),
+                        help="Process every GENERATE row, even ones the send ledger says were already sent")
+    parser.add_argument('--chunk-size', type=int, default=int(os.getenv('CHUNK_SIZE', 0)),
+                        help="Stream the master file this many rows at a time (0 loads it all at once)")
+    parser.add_argument('--pipeline', choices=['async', 'staged'], default=os.getenv('PIPELINE', 'async'),
+                        help="'async' overlaps planning, rendering and sending; 'staged' runs them one after another")
+    parser.add_argument('--queue-size', type=int, default=int(os.getenv('PIPELINE_QUEUE_SIZE', 100)),
+                        help="Jobs buffered between async pipeline stages")
+    parser.add_argument('--batch-size', type=int, default=int(os.getenv('RENDER_BATCH_SIZE', 1)),
+                        help="Diamond Passes rendered per wkhtmltopdf call")
+    parser.add_argument('--in-memory-pdfs', action='store_true',
+                        default=os.getenv('IN_MEMORY_PDFS', '').lower() in ('1', 'true', 'yes'),
+                        help="Attach rendered PDFs straight from memory and write the Diamond Passes copies in the background")
+    parser.add_argument('--digest', action='store_true',
+                        default=os.getenv('DIGEST_EMAILS', '').lower() in ('1', 'true', 'yes'),
+                        help="Send each recipient one email with all of their passes")
+    parser.add_argument('--spool', action='store_true',
+                        default=os.getenv('SPOOL', '').lower() in ('1', 'true', 'yes'),
+                        help="Write finished emails to the outbox instead of sending them (send later with drain_outbox.py)")
+    parser.add_argument('--outbox-dir', default=os.getenv('OUTBOX_DIR', OUTBOX_DIR),
+                        help="Maildir-style outbox used by --spool")
+    parser.add_argument('--watch', action='store_true',
+                        default=os.getenv('WATCH', '').lower() in ('1', 'true', 'yes'),
+                        help="Keep running and process new or changed master file rows as soon as they appear")
+    parser.add_argument('--poll-seconds', type=float, default=float(os.getenv('WATCH_POLL_SECONDS', 5)),
+                        help="How often --watch checks the master file for changes")
+    parser.add_argument('--shards', type=int, default=int(os.getenv('SHARDS', 1)),
+                        help="Split the master file into this many shards by PASS #; start one worker per shard, on any host sharing the drive")
+    parser.add_argument('--shard-dir', default=os.getenv('SHARD_DIR'),
+                        help="Directory shared by every worker for shard leases and results (default: .shards next to the master file)")
+    parser.add_argument('--lease-seconds', type=float, default=float(os.getenv('SHARD_LEASE_SECONDS', DEFAULT_LEASE_SECONDS)),
+                        help="How long a shard stays claimed after its worker stops renewing the lease")
+    parser.add_argument('--rejected-report', default=os.getenv('REJECTED_REPORT', REJECTED_REPORT),
+                        help="CSV listing the rows validation rejected (duplicate PASS #s, bad emails, dates or vehicle counts) and possible duplicates")
+    parser.add_argument('--dead-letter-file', default=os.getenv('DEAD_LETTER_FILE', DEAD_LETTER_FILE),
+                        help="JSON-lines file listing sends that failed for good and won't be retried")
+    parser.add_argument('--email-html', choices=['minified', 'full'], default=os.getenv('EMAIL_HTML', 'minified'),
+                        help="Send email bodies with minified CSS and whitespace ('minified') or as written ('full')")
+    parser.add_argument('--profile', action='store_true',
+                        default=os.getenv('PROFILE', '').lower() in ('1', 'true', 'yes'),
+                        help="Profile CPU (cProfile) and memory (tracemalloc) per stage; runs the staged pipeline on one thread, so it is slow")
+    parser.add_argument('--profile-dir', default=os.getenv('PROFILE_DIR', PROFILE_DIR),
+                        help="Where --profile writes each run's stats, collapsed stacks and allocation report")
+    parser.add_argument('--metrics-dir', default=os.getenv('METRICS_DIR', METRICS_DIR),
+                        help="Where to write the JSON-lines run log and Prometheus metrics file")
+    parser.add_argument('--prometheus-file', default=os.getenv('PROMETHEUS_FILE'),
+                        help="Prometheus text-format metrics file (default: generate_guest_passes.prom in the metrics dir)")
+    parser.add_argument('--no-metrics', action='store_true',
+                        default=os.getenv('NO_METRICS', '').lower() in ('1', 'true', 'yes'),
+                        help="Don't write a run log or metrics file")
+    return parser.parse_args(argv)
+
+class PassRun:
+    """Clients, caches and tallies shared by every batch of rows processed in one run"""
+
+    def __init__(self, args, sender, diamond_pass_pdf_dir, metrics=None, ledger=None, rejected_report=None):
+        from validation import RowValidator, RejectedRowsReport
+        self.args = args
+        self.sender = sender
+        self.diamond_pass_pdf_dir = diamond_pass_pdf_dir
+        self.metrics = metrics
+        self.javascript_delay = 0 if args.no_javascript_delay else 1000
+        self.minify_email = args.email_html == 'minified'
+        if ledger is None and not args.no_ledger:
+            ledger = SendLedger(LEDGER_FILE, journal_mode=LEDGER_JOURNAL_MODE)
+        self.ledger = ledger
+        self.profiler = None
+        if args.profile:
+            from stage_profiler import StageProfiler, profile_dir
+            self.profiler = StageProfiler(profile_dir(args.profile_dir))
+        # Profiled runs render in this process, where the profiler can see it
+        self.render_pool = RenderPool(render_pass_batch, workers=args.render_workers, inline=bool(self.profiler))
+        self.archive = ArchiveWriter() if args.in_memory_pdfs else None
+        self.outbox = Outbox(args.outbox_dir) if args.spool else None
+        self.validator = RowValidator()
+        self.rejected_report = RejectedRowsReport(rejected_report or args.rejected_report)
+        self.dead_letter = DeadLetterFile(args.dead_letter_file)
+        self.auth_failed = False  # once Gmail rejects the sign-in, the rest of the emails wait for the next run
+        self.render_cache = None
+        if not args.no_render_cache:
+            self.render_cache = RenderCache(os.path.join(diamond_pass_pdf_dir, RENDER_CACHE_INDEX),
+                                            [PASS_TEMPLATE_PATH, ND_LOGO_PATH, FOOTER_LOGO_PATH, NATIVE_PASS_SOURCE,
+                                             pass_assets.__file__])
+
+        self.diamond_passes = 0
+        self.emails_sent = 0
+        self.emails_spooled = 0
+        self.pdfs_rendered = 0
+        self.pdf_bytes = 0
+        self.already_sent = 0
+        self.rejected = 0
+        self.possible_duplicates = 0
+        self.retries_queued = 0
+        self.retries_waiting = 0
+        self.dead_lettered = 0
+        self.dead_skipped = 0
+        self.errors = []
+        self.digest_jobs = []  # --digest with the staged pipeline: ready jobs from every chunk, sent by send_digests()
+        self.failures = 0  # errors a re-run could fix (unlike rows rejected by validation)
+
+    def prepare(self, job):
+        """Build the email body and decide what a job needs next: 'render', 'send' or None (nothing)"""
+        ledger = self.ledger
+
+        # Skip rows that were already sent (or failed for good) and have not changed since,
+        # and rows whose failed send isn't due to be retried yet
+        skip_reason = ledger.skip_reason(job.pass_number, job.row_hash) if ledger else None
+        if skip_reason == 'waiting':
+            self.retries_waiting += 1
+            return None
+        if skip_reason == 'dead':
+            self.dead_skipped += 1
+            return None
+        if skip_reason:
+            self.already_sent += 1
+            if self.metrics:
+                self.metrics.count('already_sent_total')
+            return None
+
+        # Determine if this is a diamond pass or parkmobile pass
+        if job.kind == 'diamond':
+            job.body = generate_diamond_email_body(job.email_row(), job.start_date, job.end_date,
+                                                   minify=self.minify_email)
+
+            # Reuse the existing PDF if nothing about the pass has changed
+            if self.render_cache:
+                job.cache_key = self.render_cache.key(job.pass_data(), self.args.backend, self.args.render_profile)
+                if self.render_cache.lookup(job.output_path, job.cache_key):
+                    job.pdf_path = job.output_path
+                    if self.metrics:
+                        self.metrics.count('render_cache_hits_total')
+                    if ledger:
+                        ledger.record_render(job.pass_number, job.row_hash, 'diamond', job.email, 'cached',
+                                             pdf_path=job.pdf_path)
+                    return 'send'
+            return 'render'
+
+        job.body = generate_parkmobile_email_body(job.email_row(), job.start_date, job.end_date,
+                                                  minify=self.minify_email)
+        if ledger:
+            ledger.record_render(job.pass_number, job.row_hash, 'parkmobile', job.email, 'not_needed')
+        return 'send'
+
+    def render(self, jobs):
+        """Render Diamond Passes on the render pool; yields each job whose PDF is ready"""
+        batch_size = max(1, self.args.batch_size)
+        for i in range(0, len(jobs), batch_size):
+            batch = jobs[i:i + batch_size]
+            self.render_pool.submit(batch, self.render_items(batch), self.javascript_delay, self.args.backend,
+                                    self.args.render_profile)
+
+        # Collect the Diamond Pass PDFs as the render workers finish them
+        for batch, result in self.render_pool.completed():
+            yield from self.record_render_batch(batch, result)
+        if self.render_cache:
+            self.render_cache.save()
+
+    def render_items(self, batch):
+        """The `(data, output_path)` pairs to render; in memory (output_path None) with --in-memory-pdfs"""
+        if self.archive:
+            return [(job.pass_data(), None) for job in batch]
+        return [(job.pass_data(), job.output_path) for job in batch]
+
+    def record_render_batch(self, batch, result):
+        """Record a batch back from the render pool; returns the jobs that are ready to send"""
+        pdf_paths, seconds = result or (None, 0.0)
+        if self.metrics and pdf_paths:
+            for _ in batch:
+                self.metrics.observe('render_pdf', seconds / len(batch))
+        return [job for job, pdf_path in zip(batch, pdf_paths or [None] * len(batch))
+                if self.record_render(job, pdf_path)]
+
+    def record_render(self, job, pdf_path):
+        """Record a finished render; returns True if the pass is ready to send
+
+        `pdf_path` is the PDF's bytes for an in-memory render. The archival
+        copy is then written in the background, and only recorded in the
+        render cache once it is safely on disk.
+        """
+        if not pdf_path:
+            self.errors.append(f"Pass {job.pass_number}: Failed to generate PDF")
+            self.failures += 1
+            if self.ledger:
+                self.ledger.record_render(job.pass_number, job.row_hash, 'diamond', job.email, 'failed',
+                                          error="Failed to generate PDF")
+            if self.metrics:
+                self.metrics.record_pass(job, 'render_failed')
+            return False
+
+        pdf_bytes = len(pdf_path) if isinstance(pdf_path, bytes) else os.path.getsize(pdf_path)
+        self.pdfs_rendered += 1
+        self.pdf_bytes += pdf_bytes
+        if self.metrics:
+            self.metrics.count('rendered_pdf_bytes_total', pdf_bytes, profile=self.args.render_profile)
+
+        if isinstance(pdf_path, bytes):
+            job.pdf_data = pdf_path
+            pdf_path = job.output_path
+            on_written = None
+            if self.render_cache:
+                cache, key = self.render_cache, job.cache_key
+                on_written = lambda: cache.store(pdf_path, key)
+            self.archive.write(pdf_path, job.pdf_data, on_written)
+        elif self.render_cache:
+            self.render_cache.store(pdf_path, job.cache_key)
+
+        job.pdf_path = pdf_path
+        if self.ledger:
+            self.ledger.record_render(job.pass_number, job.row_hash, 'diamond', job.email, 'rendered',
+                                      pdf_path=pdf_path)
+        return True
+
+    def send(self, job):
+        """Send one job's email; safe to call from the send stage's worker threads"""
+        if self.auth_failed:
+            return SendFailure("not sent after Gmail rejected the sign-in", AUTH)
+        if self.outbox:
+            return self.spool([job], job.subject, job.body, job.pdf_path, job.pdf_data)
+        return generate_email(job.email, job.subject, job.body, job.pdf_path, sender=self.sender,
+                              metrics=self.metrics, pdf_data=job.pdf_data)
+
+    def send_digest(self, group):
+        """Send one email carrying every pass in `group` (all for the same recipient)"""
+        if len(group) == 1:
+            return self.send(group[0])
+        if self.auth_failed:
+            return SendFailure("not sent after Gmail rejected the sign-in", AUTH)
+        body = combine_email_bodies([job.body for job in group])
+        attachments = [(job.pdf_path, job.pdf_data) for job in group if job.pdf_path]
+        if self.outbox:
+            return self.spool(group, digest_subject(group), body, attachments=attachments)
+        return generate_email(group[0].email, digest_subject(group), body, sender=self.sender,
+                              metrics=self.metrics, attachments=attachments)
+
+    def spool(self, jobs, subject, body, pdf_path=None, pdf_data=None, attachments=None):
+        """Write the email for `jobs` to the outbox instead of sending it; returns a stand-in response"""
+        from gmail_sender import default_delegate_email
+        msg = build_email_message(default_delegate_email(), jobs[0].email, subject, body, pdf_path, self.metrics,
+                                  pdf_data, attachments)
+        try:
+            name = self.outbox.spool(msg, [{'pass_number': job.pass_number, 'row_hash': job.row_hash,
+                                            'kind': job.kind, 'email': job.email} for job in jobs])
+        except Exception as e:
+            print(f"Error writing to outbox: {e}")
+            return SendFailure(e, TRANSIENT)
+        return {'id': name, 'spooled': True}
+
+    def record_digest_send(self, group, message):
+        """Record a digest email against each of its passes"""
+        for i, job in enumerate(group):
+            self.record_send(job, message, new_message=i == 0)
+
+    def record_send(self, job, message, new_message=True):
+        if not message:
+            failure = message if isinstance(message, SendFailure) else SendFailure(None, TRANSIENT)
+            outcome = self.record_send_failure(job, failure)
+            fields = {'error_class': failure.error_class, 'error': str(failure)}
+        else:
+            outcome = 'spooled' if message.get('spooled') else 'sent'
+            if self.ledger:
+                self.ledger.record_send(job.pass_number, job.row_hash, outcome, message_id=message.get('id'))
+            if new_message and outcome == 'spooled':
+                self.emails_spooled += 1
+            elif new_message:
+                self.emails_sent += 1
+            if job.kind == 'diamond':
+                self.diamond_passes += 1
+            fields = {'message_id': message.get('id')}
+
+        if self.metrics:
+            if job.pdf_data is not None:
+                pdf_bytes = len(job.pdf_data)
+            else:
+                pdf_bytes = os.path.getsize(job.pdf_path) if job.pdf_path and os.path.exists(job.pdf_path) else 0
+            self.metrics.record_pass(job, outcome, pdf_bytes=pdf_bytes, **fields)
+        job.pdf_data = None  # the archival copy has its own reference until it is written
+
+    def record_send_failure(self, job, failure):
+        """Queue a failed send to be retried by a later run, or dead-letter it if retrying can't help
+
+        Returns the pass's outcome: 'send_failed' or 'dead_letter'.
+        """
+        error = str(failure)
+        email_kind = 'Diamond Pass' if job.kind == 'diamond' else 'ParkMobile'
+        if failure.error_class == AUTH and not self.auth_failed:
+            self.auth_failed = True
+            print("Gmail rejected the saved sign-in; the remaining emails will be retried on the next run")
+        if self.metrics:
+            self.metrics.count('send_failures_total', error_class=failure.error_class)
+
+        attempts = 1
+        dead = failure.error_class == PERMANENT
+        if self.ledger and dead:
+            attempts = self.ledger.retry_attempts(job.pass_number, job.row_hash) + 1  # after transient failures
+        elif self.ledger:
+            attempts = self.ledger.queue_retry(job.pass_number, job.row_hash, job.email, failure.error_class,
+                                               error, lambda attempts: retry_delay(attempts, failure.error_class))
+            dead = failure.error_class == TRANSIENT and attempts >= MAX_SEND_ATTEMPTS
+
+        if dead:
+            self.dead_lettered += 1
+            self.dead_letter.add(pass_number=job.pass_number, kind=job.kind, email=job.email, subject=job.subject,
+                                 error_class=failure.error_class, error=error, attempts=attempts)
+            if self.ledger:
+                self.ledger.record_send(job.pass_number, job.row_hash, 'dead', error=error)
+            self.errors.append(f"Pass {job.pass_number}: {email_kind} email to {job.email} failed for good - "
+                               f"{error} (see {self.dead_letter.path})")
+            return 'dead_letter'
+
+        self.failures += 1
+        if self.ledger:
+            self.retries_queued += 1
+            self.ledger.record_send(job.pass_number, job.row_hash, 'failed', error=error)
+        self.errors.append(f"Pass {job.pass_number}: Failed to send {email_kind} email to {job.email} - "
+                           f"{failure.error_class} error: {error}")
+        return 'send_failed'
+
+    def record_error(self, job, error):
+        """Record an unexpected error while preparing a job"""
+        self.errors.append(f"Pass {job.pass_number}: Unexpected error - {str(error)}")
+        self.failures += 1
+        if self.metrics:
+            self.metrics.record_pass(job, 'error', error=str(error))
+
+    @contextmanager
+    def stage(self, name, timed=True):
+        """Time a stage for the run metrics (unless `timed` is False) and profile it with --profile"""
+        with self.metrics.timer(name) if self.metrics and timed else nullcontext(), \
+                self.profiler.stage(name) if self.profiler else nullcontext():
+            yield
+
+    def plan(self, df):
+        """Parse dates, validate and plan every GENERATE row of a master file DataFrame column-wise"""
+        from planning import plan_jobs
+        with self.stage('parse_dates'):
+            invalid_dates = parse_date_columns(df)
+        with self.stage('validate'):
+            df = self.validate(df, invalid_dates)
+        with self.stage('plan'):
+            return plan_jobs(df, self.diamond_pass_pdf_dir)
+
+    def validate(self, df, invalid_dates):
+        """Drop the rows that fail validation, listing them and any possible duplicates in the rejected rows report"""
+        clean, rejected, duplicates = self.validator.validate(df, invalid_dates)
+        self.rejected += len(rejected)
+        self.possible_duplicates += len(duplicates)
+        for rows, event in [(rejected, 'rejected'), (duplicates, 'possible_duplicate')]:
+            if rows.empty:
+                continue
+            try:
+                self.rejected_report.write(rows)
+            except OSError as e:
+                print(f"Warning: Could not write the rejected rows report: {e}")
+            if self.metrics:
+                for pass_number, reasons in zip(rows['PASS #'].tolist(), rows['REASONS'].tolist()):
+                    self.metrics.count(f"{event}_rows_total")
+                    self.metrics.event(event, pass_number=pass_number, reasons=reasons)
+        return clean
+
+    def process(self, df):
+        """Plan, render and send every GENERATE row of a DataFrame, one stage after another
+
+        With --digest, the ready jobs are only collected; send_digests() sends
+        them once every chunk has been processed, so each recipient gets one email.
+        """
+        from tqdm import tqdm
+        to_render = []
+        to_send = []
+
+        # Plan every GENERATE row column-wise, then walk the compact job list
+        jobs = self.plan(df)
+        with self.stage('prepare', timed=False):
+            for job in tqdm(jobs, desc="Processing rows"):
+                try:
+                    step = self.prepare(job)
+                except Exception as e:
+                    self.record_error(job, e)
+                    continue
+                if step == 'render':
+                    to_render.append(job)
+                elif step == 'send':
+                    to_send.append(job)
+
+        with self.stage('render', timed=False):
+            to_send.extend(self.render(to_render))
+
+        if self.args.digest:
+            self.digest_jobs.extend(to_send)
+            return
+
+        # Send the emails in parallel, within Gmail's per-user quota (one by one on this thread when profiling)
+        workers = 0 if self.profiler else self.args.send_workers
+        with self.stage('send', timed=False):
+            for job, message in run_send_stage(self.send, to_send, workers=workers):
+                self.record_send(job, message)
+
+    def send_digests(self):
+        """Send the jobs process() collected with --digest, one email per recipient"""
+        jobs, self.digest_jobs = self.digest_jobs, []
+        if not jobs:
+            return
+        workers = 0 if self.profiler else self.args.send_workers
+        with self.stage('send', timed=False):
+            for group, message in run_send_stage(self.send_digest, digest_groups(jobs), workers=workers):
+                self.record_digest_send(group, message)
+
+    def close(self, finished_master_file=None):
+        """Finish background work and close everything
+
+        `finished_master_file` is the master_file_id() of a master file this
+        run read to the end. Unless something failed that a re-run could fix,
+        or sends are queued for retry, it is recorded so the next run can skip
+        the same file unread.
+        """
+        self.render_pool.close()
+        if self.archive:
+            # Finish the archival copies before the render cache index is saved
+            self.archive.close()
+            for path, error in self.archive.failed:
+                self.errors.append(f"Failed to write {os.path.basename(path)} to Diamond Passes: {error}")
+                self.failures += 1
+        if self.render_cache:
+            self.render_cache.save()
+        if self.ledger:
+            if finished_master_file and not self.failures and not self.ledger.queued_retries():
+                self.ledger.set_meta(FINISHED_MASTER_FILE_KEY, finished_master_file)
+            self.ledger.close()
+        if self.auth_failed and os.path.exists(TOKEN_FILE):
+            # Only now the batch is over, so nobody is asked to sign in halfway through it
+            print("Deleting token file; the next run will ask you to sign in to Gmail again")
+            os.remove(TOKEN_FILE)
+        if self.metrics:
+            self.metrics.close()
+        if self.profiler:
+            print(f"\nProfile written to {self.profiler.output_dir}")
+            for line in self.profiler.write():
+                print(f"  {line}")
+
+    def summary(self):
+        """This run's tallies; None marks a tally for a feature that is turned off"""
+        return {
+            'diamond_passes': self.diamond_passes,
+            'emails_sent': self.emails_sent,
+            'emails_spooled': self.emails_spooled if self.outbox else None,
+            'pdfs_rendered': self.pdfs_rendered,
+            'pdf_bytes': self.pdf_bytes,
+            'already_sent': self.already_sent if self.ledger else None,
+            'rejected': self.rejected,
+            'possible_duplicates': self.possible_duplicates,
+            'rejected_reports': [self.rejected_report.path] if self.rejected or self.possible_duplicates else [],
+            'retries_queued': self.retries_queued if self.ledger else None,
+            'retries_waiting': self.retries_waiting if self.ledger else None,
+            'dead_lettered': self.dead_lettered,
+            'dead_skipped': self.dead_skipped if self.ledger else None,
+            'dead_letter_files': [self.dead_letter.path] if self.dead_lettered else [],
+            'cache_hits': self.render_cache.hits if self.render_cache else None,
+            'cache_misses': self.render_cache.misses if self.render_cache else None,
+            'errors': list(self.errors)
+        }
+
+    def print_summary(self):
+        print_summary(self.summary())
+
+def print_summary(summary):
+    print(f"Diamond Passes generated: {summary['diamond_passes']}")
+    print(f"Total emails sent: {summary['emails_sent']}")
+    if summary['emails_spooled'] is not None:
+        print(f"Emails spooled to the outbox: {summary['emails_spooled']} (send them with drain_outbox.py)")
+    if summary.get('pdfs_rendered'):
+        print(f"PDF size: {summary['pdf_bytes'] / summary['pdfs_rendered'] / 1024:.1f} KB per pass on average "
+              f"({summary['pdfs_rendered']} rendered)")
+    if summary['already_sent'] is not None:
+        print(f"Already sent (skipped): {summary['already_sent']}")
+    reports = ', '.join(dict.fromkeys(summary.get('rejected_reports') or []))
+    if summary.get('rejected'):
+        print(f"Rejected by validation: {summary['rejected']} (listed in {reports})")
+    if summary.get('possible_duplicates'):
+        print(f"Possible duplicates, still processed: {summary['possible_duplicates']} (listed in {reports})")
+    if summary.get('retries_queued'):
+        print(f"Failed sends queued for retry: {summary['retries_queued']} (tried again by a later run)")
+    if summary.get('retries_waiting'):
+        print(f"Waiting to retry (skipped): {summary['retries_waiting']}")
+    if summary.get('dead_lettered'):
+        files = ', '.join(dict.fromkeys(summary['dead_letter_files']))
+        print(f"Failed for good: {summary['dead_lettered']} (listed in {files})")
+    if summary.get('dead_skipped'):
+        print(f"Failed for good on an earlier run (skipped until the row changes): {summary['dead_skipped']}")
+    if summary['cache_hits'] is not None:
+        print(f"Render cache: {summary['cache_hits']} hits, {summary['cache_misses']} misses")
+    if summary['errors']:
+        print("\nErrors encountered:")
+        for error in summary['errors']:
+            print(f"- {error}")
+
+def read_master_file(csv_path, chunk_size=0, offset=0, columns=None):
+    """Yield the master file as DataFrames: the whole file, or `chunk_size` rows at a time
+
+    Only the columns the pipeline uses are parsed. With `offset`, only the
+    rows from that byte on are read, and `columns` gives the file's header.
+    """
+    import pandas as pd
+    options = {'on_bad_lines': 'skip', 'usecols': lambda column: column in MASTER_FILE_COLUMNS,
+               'dtype': {column: str for column in TEXT_COLUMNS}}
+    with open(csv_path, 'rb') as f:
+        if offset:
+            f.seek(offset)
+            options.update(header=None, names=columns)
+        if chunk_size:
+            chunks = pd.read_csv(f, chunksize=chunk_size, **options)
+        else:
+            chunks = [pd.read_csv(f, **options)]
+
+        for df in chunks:
+            if 'PASS #' in df:
+                df['PASS #'] = df['PASS #'].str.strip()
+            # Validation reports counts that aren't numbers; the coerced copy keeps the ledger's row hashes
+            df['VEHICLE_COUNT_RAW'] = df['VEHICLE_COUNT']
+            df['VEHICLE_COUNT'] = pd.to_numeric(df['VEHICLE_COUNT'], errors='coerce').fillna(0).astype(int)
+            yield df
+
+def read_retry_rows(csv_path, pass_numbers):
+    """The master file rows with the given PASS #s, e.g. the ones whose failed send is due for a retry"""
+    import pandas as pd
+    frames = [df[df['PASS #'].astype(str).isin(pass_numbers)] for df in read_master_file(csv_path)]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def create_run_metrics(args, shard=None):
+    """Start this run's (or one shard's) log and metrics, unless turned off with --no-metrics"""
+    if args.no_metrics:
+        return None
+    suffix = f"-shard-{shard}-of-{args.shards}" if shard is not None else ''
+    log_path = os.path.join(args.metrics_dir, f"run-{datetime.now():%Y%m%d-%H%M%S}{suffix}.jsonl")
+    prometheus_path = args.prometheus_file or os.path.join(args.metrics_dir, 'generate_guest_passes.prom')
+    labels = None
+    if shard is not None:
+        root, extension = os.path.splitext(prometheus_path)
+        prometheus_path = f"{root}{suffix}{extension}"
+        labels = {'shard': f"{shard}-of-{args.shards}"}
+    metrics = RunMetrics(log_path, prometheus_path, labels=labels)
+    metrics.event('run_start', options=vars(args), shard=shard)
+    return metrics
+
+def process_chunks(run, chunks, taken_pass_numbers=()):
+    """Run every chunk of the master file through the pipeline chosen with --pipeline
+
+    `taken_pass_numbers` are PASS #s of master file rows not in `chunks`
+    (e.g. unchanged rows in --watch mode); a row repeating one is rejected.
+    Returns False if the master file could not be parsed.
+    """
+    import asyncio
+    import pandas as pd
+    from async_pipeline import run_pipeline
+    args = run.args
+    run.validator.reset(taken_pass_numbers)  # duplicates are looked for within one read of the master file
+    if run.profiler:
+        chunks = _profiled_reads(run, chunks)
+    try:
+        if args.pipeline == 'async' and not run.profiler:
+            asyncio.run(run_pipeline(run, chunks, queue_size=args.queue_size))
+        else:
+            try:
+                for df in chunks:
+                    run.process(df)
+            except pd.errors.ParserError:
+                run.send_digests()  # the rows read before the error still go out, as with the async pipeline
+                raise
+            run.send_digests()
+    except pd.errors.ParserError as e:
+        print(f"Failed to read CSV: {e}")
+        return False
+    return True
+
+def _profiled_reads(run, chunks):
+    """Yield the chunks, profiling the reads as the 'read' stage"""
+    while True:
+        with run.stage('read', timed=False):
+            df = next(chunks, None)
+        if df is None:
+            return
+        yield df
+
+def run_shards(args, csv_path, diamond_pass_pdf_dir, shard_dir):
+    """Work through shards of the master file until all are done, then print the combined summary
+
+    Any number of workers, on this host or others sharing the drive, can run
+    this at once. Each leases one shard at a time; a worker that runs out of
+    free shards waits, so it can take over the shard of a worker that dies.
+    """
+    try:
+        board = ShardBoard(shard_dir, args.shards, master_file_id(csv_path))
+    except OSError as e:
+        print(f"Failed to read CSV: {e}")
+        return
+    owner = worker_id()
+    sender = None
+    while True:
+        claim = board.claim_next(owner, args.lease_seconds)
+        if claim is None:
+            if len(board.results()) == args.shards:
+                break
+            time.sleep(args.lease_seconds / 4)  # the other shards are leased by live workers
+            continue
+        shard, lease = claim
+        print(f"Processing shard {shard + 1} of {args.shards}")
+
+        metrics = create_run_metrics(args, shard)
+        if sender is None and not args.spool:
+            sender = create_gmail_sender(rate_limiter=TokenBucket(args.quota_units_per_second))
+            if sender is None:
+                lease.release()
+                if metrics:
+                    metrics.close()
+                return
+        if sender is not None:
+            sender.metrics = metrics
+
+        # Every shard shares the one ledger: its PASS #s are its own, and whoever takes it over sees what was sent
+        ledger = None if args.no_ledger else SendLedger(LEDGER_FILE, journal_mode=LEDGER_JOURNAL_MODE)
+        root, extension = os.path.splitext(args.rejected_report)
+        run = PassRun(args, sender, diamond_pass_pdf_dir, metrics=metrics, ledger=ledger,
+                      rejected_report=f"{root}-shard-{shard}-of-{args.shards}{extension}")
+
+        def shard_chunks():
+            for df in read_master_file(csv_path, args.chunk_size):
+                if not lease.held():
+                    break
+                yield shard_rows(df, shard, args.shards)
+
+        try:
+            finished = process_chunks(run, shard_chunks())
+        except Exception as e:
+            print(f"Shard {shard + 1} failed: {e}")
+            lease.release()
+            return
+        finally:
+            run.close()
+
+        if not finished:
+            # Every shard reads the same file, so stop; the shards stay unfinished until it is fixed
+            run.errors.append(f"Shard {shard + 1}: master_file.csv could not be parsed, so the shard was not finished")
+            lease.release()
+            run.print_summary()
+            return
+        if not lease.held():
+            continue  # the worker that took the shard over records its result
+        board.record_result(shard, owner, run.summary())
+        lease.release()
+
+    print(f"\nSummary of all {args.shards} shards:")
+    print_summary(merge_summaries(result['summary'] for result in board.results().values()))
+
+def run_watch(args, csv_path, diamond_pass_pdf_dir):
+    """Process the master file, then keep processing its new and changed rows until stopped with Ctrl+C
+
+    The Gmail connection, templates, render workers and ledger stay open
+    between changes, so a new row is emailed within a few seconds. Failed
+    sends are retried from the master file once their retry is due.
+    """
+    metrics = create_run_metrics(args)
+    sender = None
+    if not args.spool:
+        sender = create_gmail_sender(rate_limiter=TokenBucket(args.quota_units_per_second), metrics=metrics)
+        if sender is None:
+            if metrics:
+                metrics.close()
+            return
+
+    run = PassRun(args, sender, diamond_pass_pdf_dir, metrics=metrics)
+    from master_watch import MasterFileWatcher
+    watcher = MasterFileWatcher(csv_path, read_master_file)
+    missing_retries = set()  # queued PASS #s no longer in the master file
+    print(f"Watching {csv_path} for new rows (Ctrl+C to stop)")
+    try:
+        while True:
+            df = None
+            taken = ()
+            changed = watcher.changed()
+            due = set()
+            if not changed and run.ledger and not run.auth_failed:
+                due = set(run.ledger.due_retries()) - missing_retries
+            try:
+                if changed:
+                    df = watcher.read_changes()
+                    taken = watcher.taken
+                elif due:
+                    df = read_retry_rows(csv_path, due)
+                    missing_retries |= due - set(df['PASS #'].astype(str))
+            except Exception as e:
+                print(f"Failed to read CSV: {e}")
+            if df is not None and not df.empty:
+                emails_before = run.emails_sent + run.emails_spooled
+                description = "failed send(s) due for a retry" if due else "new or changed row(s) in the master file"
+                print(f"{datetime.now():%H:%M:%S} {len(df)} {description}")
+                process_chunks(run, iter([df]), taken)
+                print(f"{datetime.now():%H:%M:%S} {run.emails_sent + run.emails_spooled - emails_before} email(s) sent")
+                if run.render_cache:
+                    run.render_cache.save()
+                if metrics:
+                    metrics.write_prometheus()
+            time.sleep(args.poll_seconds)
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    finally:
+        run.close()
+
+    run.print_summary()
+
+def main(argv=None):
     """Main function to process the master file and generate passes"""
+    args = parse_args(argv)
+
     # Base directory for the master file
     directory_path = r"G:\Shared drives\Card Office\Department Guest Parking Passes"
     csv_path = os.path.join(directory_path, "master_file.csv")
@@ -573,76 +1325,56 @@ def main():
     diamond_pass_pdf_dir = os.path.join(directory_path, "Diamond Passes")
     os.makedirs(diamond_pass_pdf_dir, exist_ok=True)
 
+    if args.watch:
+        run_watch(args, csv_path, diamond_pass_pdf_dir)
+        return
+
+    if args.shards > 1:
+        run_shards(args, csv_path, diamond_pass_pdf_dir, args.shard_dir or os.path.join(directory_path, '.shards'))
+        return
+
+    # Scheduled runs usually find the master file as the last run left it; stop before loading anything heavy
+    try:
+        file_id = master_file_id(csv_path)
+    except OSError as e:
+        print(f"Failed to read CSV: {e}")
+        return
+    ledger = None if args.no_ledger else SendLedger(LEDGER_FILE, journal_mode=LEDGER_JOURNAL_MODE)
+    if ledger and ledger.get_meta(FINISHED_MASTER_FILE_KEY) == file_id:
+        print("master_file.csv hasn't changed since the last run finished; nothing to do")
+        ledger.close()
+        return
+
+    # Read the first chunk (or the whole file) before authenticating
+    chunks = read_master_file(csv_path, args.chunk_size)
     try:
-        df = pd.read_csv(csv_path, on_bad_lines='skip')
-        df['VEHICLE_COUNT'] = pd.to_numeric(df['VEHICLE_COUNT'], errors='coerce').fillna(0).astype(int)
+        first_chunk = next(chunks)
     except Exception as e:
         print(f"Failed to read CSV: {e}")
+        if ledger:
+            ledger.close()
         return
 
-    diamond_passes = 0
-    emails_sent = 0
-    errors = []
-    
-    # Process each row in the CSV
-    for index, row in tqdm(df.iterrows(), total=df.shape[0], desc="Processing rows"):
-        if not row['GENERATE']:
-            continue
-            
-        try:
-            start_date = parse_date(row['START'])
-            end_date = parse_date(row['END'])
-            
-            if start_date is None or end_date is None:
-                errors.append(f"Pass {row['PASS #']}: Invalid dates - START: {row['START']}, END: {row['END']}")
-                continue
+    metrics = create_run_metrics(args)
+    sender = None
+    if not args.spool:  # spooled emails are sent later by drain_outbox.py
+        sender = create_gmail_sender(rate_limiter=TokenBucket(args.quota_units_per_second), metrics=metrics)
+        if sender is None:
+            if metrics:
+                metrics.close()
+            if ledger:
+                ledger.close()
+            return
 
-            # Create data for diamond pass
-            data = {
-                'ACADEMIC_YEAR_START': str(datetime.now().year),
-                'ACADEMIC_YEAR_END': str(datetime.now().year + 1),
-                'PASS_TYPE': 'UNIVERSITY OF NOTRE DAME',
-                'PARKING_TYPE': 'GUEST PARKING PASS',
-                'VALID_UNTIL': format_date_range(row['START'], row['END']),
-                'LOT': 'C LOT',
-                'ADD LOT': f"OR {row['ADD LOT']}" if pd.notna(row.get('ADD LOT', '')) else '',
-                'PASS_NUMBER': str(row['PASS #'])
-            }
+    run = PassRun(args, sender, diamond_pass_pdf_dir, metrics=metrics, ledger=ledger)
+    finished = False
+    try:
+        finished = process_chunks(run, itertools.chain([first_chunk], chunks))
+    finally:
+        run.close(finished_master_file=file_id if finished else None)
 
-            # Determine if this is a diamond pass or parkmobile pass
-            if row['VEHICLE_COUNT'] <= 10:
-                # Generate diamond pass
-                filename = f"diamondPass_{row['DEPARTMENT']}_{row['PASS #']}.pdf"
-                filename = "".join(c for c in filename if c.isalnum() or c in ('_', '-', '.'))
-                
-                pdf_path = generate_diamond_pass_pdf(data, os.path.join(diamond_pass_pdf_dir, filename))
-                if pdf_path:
-                    email_body = generate_diamond_email_body(row, start_date, end_date)
-                    if generate_email(row['EMAIL'], "Diamond Parking Pass", email_body, pdf_path):
-                        diamond_passes += 1
-                        emails_sent += 1
-                    else:
-                        errors.append(f"Pass {row['PASS #']}: Failed to send Diamond Pass email to {row['EMAIL']}")
-                else:
-                    errors.append(f"Pass {row['PASS #']}: Failed to generate PDF")
-            else:
-                # Generate parkmobile pass
-                email_body = generate_parkmobile_email_body(row, start_date, end_date)
-                if generate_email(row['EMAIL'], "ParkMobile Access Code", email_body):
-                    emails_sent += 1
-                else:
-                    errors.append(f"Pass {row['PASS #']}: Failed to send ParkMobile email to {row['EMAIL']}")
-                
-        except Exception as e:
-            errors.append(f"Pass {row['PASS #']}: Unexpected error - {str(e)}")
-            
     # Print summary
-    print(f"Diamond Passes generated: {diamond_passes}")
-    print(f"Total emails sent: {emails_sent}")
-    if errors:
-        print("\nErrors encountered:")
-        for error in errors:
-            print(f"- {error}")
+    run.print_summary()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,134 @@
+import os
+import pickle
+import base64
+import threading
+import time
+from datetime import datetime, timedelta
+import google_auth_httplib2
+from googleapiclient.discovery import build
+from googleapiclient.http import build_http
+from googleapiclient.errors import HttpError
+from google.auth.transport.requests import Request
+from rate_limit import GMAIL_SEND_QUOTA_UNITS, is_rate_limit_error, retry_after_seconds, backoff_delay
+
+# Refresh the access token this long before it expires so it never lapses mid-send
+REFRESH_MARGIN = timedelta(minutes=5)
+
+
+def default_delegate_email():
+    """The mailbox passes are sent from, as configured in .env"""
+    return os.getenv('GMAIL_DELEGATE_EMAIL', 'parking@nd.edu')
+
+
+class GmailSender:
+    """Long-lived Gmail client shared by every email sent during a run"""
+
+    def __init__(self, creds, delegate_email=None, token_file=None, api_endpoint=None,
+                 rate_limiter=None, max_retries=5, metrics=None):
+        self.creds = creds
+        self.delegate_email = delegate_email or default_delegate_email()
+        self.token_file = token_file
+        self.api_endpoint = api_endpoint
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.metrics = metrics
+        self.service = None
+        self._refresh_lock = threading.Lock()
+        self._local = threading.local()
+        self._build_service()
+
+    def _build_service(self):
+        """Build the Gmail service once; its HTTP object keeps the connection open between sends
+
+        The API description comes from the discovery document bundled with
+        google-api-python-client, so building the service never goes online.
+        """
+        client_options = {'api_endpoint': self.api_endpoint} if self.api_endpoint else None
+        self.service = build('gmail', 'v1', credentials=self.creds, client_options=client_options,
+                             cache_discovery=False, static_discovery=True)
+
+        # Set up delegation
+        self.service._http.credentials._delegate = self.delegate_email
+        self._local.http = self.service._http
+
+    def _http(self):
+        """Return this thread's authorized HTTP object (httplib2 is not thread-safe)
+
+        build_http() gives it the same socket timeout build() uses, so a dead
+        connection can't hang a send worker forever.
+        """
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(self.creds, http=build_http())
+            self._local.http = http
+        return http
+
+    def ensure_fresh(self):
+        """Refresh the access token if it is expired or about to expire"""
+        with self._refresh_lock:
+            expiry = getattr(self.creds, 'expiry', None)
+            if expiry is None and self.creds.valid:
+                return
+            if expiry is not None and expiry - datetime.utcnow() > REFRESH_MARGIN:
+                return
+            if not getattr(self.creds, 'refresh_token', None):
+                return
+
+            self.creds.refresh(Request())
+            if self.token_file:
+                with open(self.token_file, 'wb') as token:
+                    pickle.dump(self.creds, token)
+
+    def send(self, msg):
+        """Send a MIME message and return the Gmail API response
+
+        Waits on the rate limiter before each attempt and retries 429 and
+        rateLimitExceeded responses with jittered exponential backoff.
+        """
+        self.ensure_fresh()
+        start = time.perf_counter()
+        raw = base64.urlsafe_b64encode(msg.as_bytes()).decode()
+        if self.metrics:
+            self.metrics.observe('mime_encode', time.perf_counter() - start)
+            self.metrics.count('message_bytes_total', len(raw))
+        return self._send_raw(raw)
+
+    def send_bytes(self, data):
+        """Send an already serialized RFC 822 message (e.g. one from the outbox)"""
+        self.ensure_fresh()
+        raw = base64.urlsafe_b64encode(data).decode()
+        if self.metrics:
+            self.metrics.count('message_bytes_total', len(raw))
+        return self._send_raw(raw)
+
+    def _send_raw(self, raw):
+        """Send a base64url-encoded message, waiting on the rate limiter and retrying rate-limit errors"""
+        request = self.service.users().messages().send(
+            userId='me',  # Use 'me' since we're already delegated
+            body={'raw': raw}
+        )
+
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire(GMAIL_SEND_QUOTA_UNITS)
+            start = time.perf_counter()
+            try:
+                response = request.execute(http=self._http())
+            except HttpError as e:
+                if self.metrics:
+                    self.metrics.observe('gmail_request', time.perf_counter() - start)
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                if self.metrics:
+                    self.metrics.count('send_retries_total')
+                if self.rate_limiter:
+                    self.rate_limiter.drain()
+                delay = retry_after_seconds(e) or backoff_delay(attempt)
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            if self.metrics:
+                self.metrics.observe('gmail_request', time.perf_counter() - start)
+            return response
@@ -0,0 +1,115 @@
+import os
+import time
+import pandas as pd
+
+# Bytes just before the end of the last read, used to check that a bigger file was only appended to
+TAIL_CHECK_BYTES = 4096
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_tail(path, end):
+    start = max(0, end - TAIL_CHECK_BYTES)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+class MasterFileWatcher:
+    """Works out which master file rows are new or changed since the last look
+
+    The file is only read when its mtime or size changes. If it has only
+    grown, and the bytes it ended with last time are still in place, just
+    the appended rows are parsed. Otherwise the whole file is read and
+    compared row by row against a hash of every row seen so far, keyed by
+    PASS # and by how many earlier rows in the file share that PASS #.
+
+    After each read, `taken` holds the PASS #s the changed rows may not
+    claim: every PASS # in the file, except those whose first row is among
+    the changes. A changed first row is an update of its pass; a changed
+    later row repeating a PASS # is a duplicate.
+
+    `read_master_file(path, offset=0, columns=None)` yields the file (or the
+    part from byte `offset` on) as DataFrames.
+    """
+
+    def __init__(self, csv_path, read_master_file):
+        self.csv_path = csv_path
+        self.read_master_file = read_master_file
+        self.signature = None
+        self.offset = 0
+        self.tail = b''
+        self.columns = None
+        self.dtypes = {}
+        self.row_index = {}  # (PASS #, earlier rows with that PASS #) -> hash of the row
+        self.pass_number_rows = {}  # PASS # -> rows in the file with it
+        self.taken = set()
+
+    def _row_hashes(self, df):
+        return pd.util.hash_pandas_object(df.astype(str), index=False).tolist()
+
+    def changed(self):
+        """True if the file has changed since it was last read and is no longer being written"""
+        try:
+            signature = _signature(self.csv_path)
+        except OSError:
+            return False
+        if signature == self.signature:
+            return False
+        # Wait for the file to stop changing, in case it is still being exported or copied
+        time.sleep(0.5)
+        try:
+            return _signature(self.csv_path) == signature
+        except OSError:
+            return False
+
+    def read_changes(self):
+        """Return a DataFrame of the rows that are new or changed since the last call
+
+        The first call returns every row.
+        """
+        signature = _signature(self.csv_path)
+        size = signature[1]
+        appended = (self.signature is not None and size > self.offset and self.tail.endswith(b'\n')
+                    and _read_tail(self.csv_path, self.offset) == self.tail)
+
+        if appended:
+            frames = list(self.read_master_file(self.csv_path, offset=self.offset, columns=self.columns))
+        else:
+            self.columns = list(pd.read_csv(self.csv_path, nrows=0).columns)
+            frames = list(self.read_master_file(self.csv_path))
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+        if appended:
+            # A numeric column the whole file reads as float (it has blanks) may read as int in the
+            # appended rows alone; match the full read so the rows hash the same either way
+            for column, dtype in self.dtypes.items():
+                if column in df and dtype.kind == 'f' and df[column].dtype.kind in 'iu':
+                    df[column] = df[column].astype(dtype)
+        else:
+            self.dtypes = dict(df.dtypes)
+
+        self.signature = signature
+        self.offset = size
+        self.tail = _read_tail(self.csv_path, size)
+        if not appended:
+            self.pass_number_rows = {}
+        if df.empty:
+            self.taken = set(self.pass_number_rows)
+            return df
+
+        # Keep rows that are new or whose contents changed
+        row_keys = []
+        for key in df['PASS #'].fillna('').astype(str).str.strip().tolist():
+            earlier = self.pass_number_rows.get(key, 0)
+            row_keys.append((key, earlier))
+            self.pass_number_rows[key] = earlier + 1
+        hashes = self._row_hashes(df)
+        changed = [self.row_index.get(row_key) != value for row_key, value in zip(row_keys, hashes)]
+        self.row_index.update(zip(row_keys, hashes))
+        updated = {key for (key, earlier), is_changed in zip(row_keys, changed) if is_changed and earlier == 0}
+        self.taken = set(self.pass_number_rows) - updated
+        return df[changed]
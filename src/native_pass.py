@@ -0,0 +1,163 @@
+import os
+import io
+from reportlab import rl_config
+from reportlab.lib.colors import HexColor, black, red
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+from template_cache import cached
+
+NAVY = HexColor('#0c2340')
+LIGHT_GRAY = HexColor('#cccccc')
+GRAY = HexColor('#666666')
+
+FONT = 'Helvetica'
+FONT_BOLD = 'Helvetica-Bold'
+
+PAGE_WIDTH, PAGE_HEIGHT = letter
+CONTENT_LEFT = 36
+CONTENT_RIGHT = PAGE_WIDTH - 36
+CENTER_X = PAGE_WIDTH / 2
+
+INSTRUCTIONS = [
+    "Place this pass face-up on your vehicle's dashboard while parked.",
+    "Do not park in Reserved Spaces or ADA Spaces (without hangtag.)",
+    "Do not block driveways or dumpsters.",
+    "Do not park in gated lots.",
+]
+
+
+def load_image(path):
+    """Return a decoded ImageReader for `path`, shared by every pass in this process"""
+    return cached(('image', path), [path], lambda: ImageReader(path))
+
+
+def _fit_font_size(text, font, size, max_width):
+    """Shrink `size` until `text` fits in `max_width`, like white-space: nowrap on a fixed box"""
+    width = stringWidth(text, font, size)
+    return size if width <= max_width else size * max_width / width
+
+
+def _dashed_box(c, x, y, width, height, color):
+    c.saveState()
+    c.setStrokeColor(color)
+    c.setLineWidth(1.5)
+    c.setDash(6, 4)
+    c.rect(x, y, width, height, stroke=1, fill=0)
+    c.restoreState()
+
+
+def _centered(c, text, y, font, size, color, max_width):
+    size = _fit_font_size(text, font, size, max_width)
+    c.setFont(font, size)
+    c.setFillColor(color)
+    c.drawCentredString(CENTER_X, y, text)
+
+
+def draw_pass(c, data, nd_logo, footer_logo):
+    """Draw one Diamond Pass on the current page of canvas `c`
+
+    Mirrors the layout of templates/diamondPass.html on a US Letter page.
+    """
+    content_width = CONTENT_RIGHT - CONTENT_LEFT
+
+    # Outer dashed border
+    _dashed_box(c, CONTENT_LEFT, 56, content_width, 680, black)
+
+    # Year header: start year, ND logo, end year
+    year_start = str(data.get('ACADEMIC_YEAR_START', ''))
+    year_end = str(data.get('ACADEMIC_YEAR_END', ''))
+    year_size = 72
+    logo_height = 105
+    logo_width = logo_height * nd_logo.getSize()[0] / nd_logo.getSize()[1]
+    gap = 15
+    start_width = stringWidth(year_start, FONT_BOLD, year_size)
+    end_width = stringWidth(year_end, FONT_BOLD, year_size)
+    x = CENTER_X - (start_width + gap + logo_width + gap + end_width) / 2
+    baseline = 615
+    c.setFont(FONT_BOLD, year_size)
+    c.setFillColor(NAVY)
+    c.drawString(x, baseline, year_start)
+    x += start_width + gap
+    c.drawImage(nd_logo, x, baseline + 26 - logo_height / 2, logo_width, logo_height, mask='auto')
+    x += logo_width + gap
+    c.drawString(x, baseline, year_end)
+
+    # Pass details
+    _dashed_box(c, CONTENT_LEFT + 30, 470, content_width - 60, 86, LIGHT_GRAY)
+    _centered(c, str(data.get('PASS_TYPE', 'UNIVERSITY OF NOTRE DAME')), 522, FONT_BOLD, 26, NAVY,
+              content_width - 80)
+    _centered(c, str(data.get('PARKING_TYPE', 'GUEST PARKING PASS')), 486, FONT_BOLD, 26, NAVY,
+              content_width - 80)
+
+    # Validity: navy label, red dates
+    label = "VALID: "
+    valid_until = str(data.get('VALID_UNTIL', ''))
+    size = _fit_font_size(label + valid_until, FONT_BOLD, 30, content_width - 20)
+    label_width = stringWidth(label, FONT_BOLD, size)
+    x = CENTER_X - stringWidth(label + valid_until, FONT_BOLD, size) / 2
+    c.setFont(FONT_BOLD, size)
+    c.setFillColor(NAVY)
+    c.drawString(x, 425, label)
+    c.setFillColor(red)
+    c.drawString(x + label_width, 425, valid_until)
+
+    # Parking location
+    box_width = content_width * 0.9
+    _dashed_box(c, CENTER_X - box_width / 2, 285, box_width, 115, NAVY)
+    _centered(c, "AUTHORIZED FOR PARKING IN ANY", 370, FONT_BOLD, 26, NAVY, box_width - 20)
+    _centered(c, str(data.get('LOT', 'C LOT')), 335, FONT_BOLD, 26, NAVY, box_width - 20)
+    add_lot = str(data.get('ADD LOT', ''))
+    if add_lot:
+        _centered(c, add_lot, 300, FONT_BOLD, 26, NAVY, box_width - 20)
+
+    # Instructions
+    c.setFont(FONT, 12)
+    c.setFillColor(black)
+    y = 255
+    for line in INSTRUCTIONS:
+        c.drawString(CONTENT_LEFT + 52, y, "•")
+        c.drawString(CONTENT_LEFT + 66, y, line)
+        y -= 18
+
+    # Safety notice and footer logo
+    _centered(c, "Be Safe! Lock your vehicle.", 165, FONT, 11, black, content_width)
+    _centered(c, "Call 574-631-5555 for any emergency.", 150, FONT, 11, red, content_width)
+    footer_height = 52
+    footer_width = footer_height * footer_logo.getSize()[0] / footer_logo.getSize()[1]
+    c.drawImage(footer_logo, CENTER_X - footer_width / 2, 90, footer_width, footer_height, mask='auto')
+
+    # Pass number, bottom right
+    c.setFont(FONT, 9)
+    c.setFillColor(GRAY)
+    c.drawRightString(CONTENT_RIGHT - 15, 64, f"Pass number: {data.get('PASS_NUMBER', '')}")
+
+
+def generate_native_pass_pdf(data, output_path, nd_logo_path, footer_logo_path, ascii85=True):
+    """Write one Diamond Pass PDF; the logos are embedded once each as image XObjects
+
+    With `output_path=None` the PDF is built in memory and its bytes returned.
+    `ascii85=False` stores the logos as plain binary instead of reportlab's
+    default ASCII85 text.
+    """
+    nd_logo = load_image(nd_logo_path)
+    footer_logo = load_image(footer_logo_path)
+
+    # reportlab reads this setting while writing the PDF; render workers draw one pass at a time
+    use_a85 = rl_config.useA85
+    rl_config.useA85 = 1 if ascii85 else 0
+    try:
+        if output_path is None:
+            buffer = io.BytesIO()
+            c = Canvas(buffer, pagesize=letter)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            c = Canvas(output_path, pagesize=letter)
+        c.setTitle(f"Guest Parking Pass {data.get('PASS_NUMBER', '')}")
+        draw_pass(c, data, nd_logo, footer_logo)
+        c.showPage()
+        c.save()
+    finally:
+        rl_config.useA85 = use_a85
+    return buffer.getvalue() if output_path is None else output_path
@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import base64
+import socket
+import itertools
+
+# Header carrying the spooled passes' details; removed again before the message is sent
+SPOOL_HEADER = 'X-Guest-Pass-Spool'
+
+FOLDERS = ('tmp', 'new', 'cur', 'sent', 'failed')
+
+_sequence = itertools.count()
+
+
+def _encode_passes(passes):
+    # base64 so the header is one unbroken token that is never folded across lines
+    return base64.urlsafe_b64encode(json.dumps(passes, separators=(',', ':'), default=str).encode()).decode()
+
+
+def _split_spool_header(data):
+    """Return (message without the spool header, passes listed in it)"""
+    head, separator, body = data.partition(b'\n\n')
+    prefix = SPOOL_HEADER.lower().encode() + b':'
+    kept = []
+    value = None
+    in_spool_header = False
+    for line in head.split(b'\n'):
+        if line.lower().startswith(prefix):
+            value = line[len(prefix):].strip()
+            in_spool_header = True
+        elif in_spool_header and line[:1] in (b' ', b'\t'):
+            value += line.strip()  # folded continuation line
+        else:
+            in_spool_header = False
+            kept.append(line)
+    passes = json.loads(base64.urlsafe_b64decode(value)) if value is not None else []
+    return b'\n'.join(kept) + separator + body, passes
+
+
+class Outbox:
+    """Maildir-style spool of fully built messages waiting to be sent
+
+    Messages are written to tmp/ and renamed into new/, so a message in
+    new/ is always complete. A drain claims a message by renaming it into
+    cur/ (only one drain can win that rename), then moves it to sent/ or
+    failed/ once Gmail has answered.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        for folder in FOLDERS:
+            os.makedirs(os.path.join(root, folder), exist_ok=True)
+
+    def path(self, folder, name):
+        return os.path.join(self.root, folder, name)
+
+    def spool(self, msg, passes):
+        """Write a MIME message to new/ and return its file name
+
+        `passes` lists the `{'pass_number', 'row_hash', 'kind'}` of every pass
+        the message carries, so the drain can update the send ledger.
+        """
+        msg[SPOOL_HEADER] = _encode_passes(passes)
+        data = msg.as_bytes()
+        name = f"{time.time_ns()}.P{os.getpid()}Q{next(_sequence)}.{socket.gethostname()}"
+        tmp_path = self.path('tmp', name)
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path('new', name))
+        return name
+
+    def pending(self):
+        return sorted(os.listdir(os.path.join(self.root, 'new')))
+
+    def claim(self, name):
+        """Move a message from new/ to cur/; False if another drain claimed it first"""
+        try:
+            os.rename(self.path('new', name), self.path('cur', name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def read(self, name):
+        """Return a claimed message's bytes (without the spool header) and the passes it carries"""
+        with open(self.path('cur', name), 'rb') as f:
+            return _split_spool_header(f.read())
+
+    def finish(self, name, folder):
+        """Move a claimed message to sent/ or failed/"""
+        os.replace(self.path('cur', name), self.path(folder, name))
+
+    def release(self, name):
+        """Move a claimed message back to new/ for a later drain to try again"""
+        os.replace(self.path('cur', name), self.path('new', name))
+
+    def requeue_failed(self):
+        """Move every message in failed/ back to new/ to be tried again"""
+        names = os.listdir(os.path.join(self.root, 'failed'))
+        for name in names:
+            os.replace(self.path('failed', name), self.path('new', name))
+        return len(names)
+
+    def counts(self):
+        return {folder: len(os.listdir(os.path.join(self.root, folder))) for folder in FOLDERS}
@@ -0,0 +1,53 @@
+import os
+from template_cache import cached, file_digest
+
+# Printed heights of the pass logos (templates/diamondPass.html: 140px and 70px at 96 CSS px per inch)
+ND_LOGO_HEIGHT_INCHES = 140 / 96
+FOOTER_LOGO_HEIGHT_INCHES = 70 / 96
+
+# Settings for each --render-profile. 'print' is the original output: full-resolution
+# logos and wkhtmltopdf's highest image quality. 'compact' scales the logos to their
+# printed size at `logo_dpi` and re-encodes them with a 256-colour palette, which
+# prints the same on a dashboard pass but roughly halves each PDF.
+# The native backend also skips reportlab's ASCII85 wrapping of image data, which
+# only makes binary data 25% bigger.
+RENDER_PROFILES = {
+    'print': {'logo_dpi': None, 'ascii85': True,
+              'pdfkit': {'dpi': '300', 'image-quality': '100'}},
+    'compact': {'logo_dpi': 200, 'ascii85': False,
+                'pdfkit': {'dpi': '300', 'image-dpi': '200', 'image-quality': '90'}},
+}
+
+
+def scaled_logo(path, height_inches, dpi, cache_dir):
+    """Return the path of a copy of logo `path` sized for printing at `height_inches` and `dpi`
+
+    The copy is downscaled (never enlarged) and saved as an optimized
+    palette PNG under `cache_dir`, named after the original's contents, so
+    it is built once and shared by every render worker and later run.
+    """
+    def build():
+        from PIL import Image
+        target_height = round(height_inches * dpi)
+        name, _ = os.path.splitext(os.path.basename(path))
+        scaled_path = os.path.join(cache_dir, f"{name}-{file_digest(path)[:12]}-{target_height}px.png")
+        if os.path.exists(scaled_path):
+            return scaled_path
+
+        with Image.open(path) as image:
+            image.load()
+            if image.height > target_height:
+                width = round(image.width * target_height / image.height)
+                image = image.resize((width, target_height), Image.LANCZOS)
+            if image.mode == 'RGBA':
+                image = image.quantize(256, method=Image.Quantize.FASTOCTREE)
+            elif image.mode != 'P':
+                image = image.convert('RGB').quantize(256)
+
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{scaled_path}.{os.getpid()}.tmp"
+            image.save(tmp_path, 'PNG', optimize=True)
+        os.replace(tmp_path, scaled_path)
+        return scaled_path
+
+    return cached(('scaled_logo', path, height_inches, dpi, cache_dir), [path], build)
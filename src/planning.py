@@ -0,0 +1,119 @@
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from send_ledger import row_hashes
+
+# Requests for more vehicles than this get a ParkMobile access code instead of a Diamond Pass
+DIAMOND_MAX_VEHICLES = 10
+
+DIAMOND_SUBJECT = "Diamond Parking Pass"
+PARKMOBILE_SUBJECT = "ParkMobile Access Code"
+DIGEST_SUBJECT = "Guest Parking Passes"
+
+
+class PassJob:
+    """One GENERATE row, planned and ready for the render and send stages"""
+    __slots__ = ('pass_number', 'kind', 'email', 'first_name', 'event', 'parkmobile',
+                 'start_date', 'end_date', 'academic_year', 'valid_until', 'add_lot', 'output_path', 'row_hash',
+                 'subject', 'body', 'pdf_path', 'pdf_data', 'cache_key')
+
+    def __init__(self, pass_number, kind, email, first_name=None, event=None, parkmobile=None,
+                 start_date=None, end_date=None, academic_year=None, valid_until=None, add_lot='', output_path=None, row_hash=None,
+                 subject=None):
+        self.pass_number = pass_number
+        self.kind = kind
+        self.email = email
+        self.first_name = first_name
+        self.event = event
+        self.parkmobile = parkmobile
+        self.start_date = start_date
+        self.end_date = end_date
+        self.academic_year = academic_year
+        self.valid_until = valid_until
+        self.add_lot = add_lot
+        self.output_path = output_path
+        self.row_hash = row_hash
+        self.subject = subject
+        # Filled in by the render and send stages
+        self.body = None
+        self.pdf_path = None
+        self.pdf_data = None
+        self.cache_key = None
+
+    def pass_data(self):
+        """The `data` dict generate_diamond_pass_pdf expects"""
+        return {
+            'ACADEMIC_YEAR_START': str(self.academic_year),
+            'ACADEMIC_YEAR_END': str(self.academic_year + 1),
+            'PASS_TYPE': 'UNIVERSITY OF NOTRE DAME',
+            'PARKING_TYPE': 'GUEST PARKING PASS',
+            'VALID_UNTIL': self.valid_until,
+            'LOT': 'C LOT',
+            'ADD LOT': self.add_lot,
+            'PASS_NUMBER': str(self.pass_number)
+        }
+
+    def email_row(self):
+        """The row fields the email body builders read"""
+        row = {'FIRST_NAME': self.first_name, 'PARKMOBILE': self.parkmobile, 'PASS #': self.pass_number}
+        if self.event is not None:
+            row['EVENT'] = self.event
+        return row
+
+
+def _column(df, name):
+    """Return a column, or all-None if the master file doesn't have it"""
+    if name in df:
+        return df[name]
+    return pd.Series(None, index=df.index, dtype=object)
+
+
+def _format_dates(dates, fmt):
+    """strftime a datetime column, formatting each distinct date only once"""
+    distinct = dates.dropna().unique()
+    formatted = dict(zip(distinct, pd.DatetimeIndex(distinct).strftime(fmt)))
+    return dates.map(formatted)
+
+
+def plan_jobs(df, diamond_pass_pdf_dir, now=None):
+    """Turn the GENERATE rows of the master file into PassJobs, computing every field column-wise
+
+    Expects the START_DATE/END_DATE columns from parse_date_columns(), and
+    rows that passed validation, so every date is valid.
+    """
+    selected = df[df['GENERATE'].astype(bool)]
+    if selected.empty:
+        return []
+
+    academic_year = (now or datetime.now()).year
+
+    # VALID_UNTIL: "01/30/25" or "01/30/25 - 01/31/25"
+    start_str = _format_dates(selected['START_DATE'], '%m/%d/%y')
+    end_str = _format_dates(selected['END_DATE'], '%m/%d/%y')
+    valid_until = start_str.where(start_str == end_str, start_str + ' - ' + end_str)
+
+    add_lot_raw = _column(selected, 'ADD LOT')
+    add_lot = ('OR ' + add_lot_raw.astype(str)).where(add_lot_raw.notna(), '')
+
+    pass_numbers = selected['PASS #']
+    # map(str), not astype(str): pandas 3 keeps blanks as NaN there, and a NaN name would fail the whole chunk
+    filenames = ('diamondPass_' + _column(selected, 'DEPARTMENT').map(str) + '_' + pass_numbers.map(str)
+                 + '.pdf').str.replace(r'[^\w.-]', '', regex=True)
+    output_paths = [os.path.join(diamond_pass_pdf_dir, filename) for filename in filenames.tolist()]
+
+    is_diamond = (selected['VEHICLE_COUNT'] <= DIAMOND_MAX_VEHICLES).to_numpy()
+    kinds = np.where(is_diamond, 'diamond', 'parkmobile').tolist()
+    subjects = np.where(is_diamond, DIAMOND_SUBJECT, PARKMOBILE_SUBJECT).tolist()
+    events = selected['EVENT'].tolist() if 'EVENT' in selected else [None] * len(selected)
+
+    return [
+        PassJob(pass_number, kind, email, first_name, event, parkmobile, start_date, end_date,
+                academic_year, until, lot, output_path, hash_value, subject)
+        for (pass_number, kind, email, first_name, event, parkmobile, start_date, end_date,
+             until, lot, output_path, hash_value, subject) in zip(
+            pass_numbers.tolist(), kinds, _column(selected, 'EMAIL').tolist(),
+            _column(selected, 'FIRST_NAME').tolist(), events, _column(selected, 'PARKMOBILE').tolist(),
+            selected['START_DATE'].tolist(), selected['END_DATE'].tolist(), valid_until.tolist(),
+            add_lot.tolist(), output_paths, row_hashes(selected), subjects)
+    ]
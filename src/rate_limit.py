@@ -0,0 +1,73 @@
+import random
+import threading
+import time
+
+# Gmail API quota: every user gets 250 quota units per second, and
+# users.messages.send costs 100 units.
+# https://developers.google.com/gmail/api/reference/quota
+GMAIL_USER_QUOTA_UNITS_PER_SECOND = 250
+GMAIL_SEND_QUOTA_UNITS = 100
+
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+
+class TokenBucket:
+    """Thread-safe token bucket measured in Gmail quota units"""
+
+    def __init__(self, rate=GMAIL_USER_QUOTA_UNITS_PER_SECOND, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, cost=GMAIL_SEND_QUOTA_UNITS):
+        """Block until `cost` units are available, then take them"""
+        cost = min(cost, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= cost:
+                    self.tokens -= cost
+                    return
+                wait = (cost - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def drain(self):
+        """Empty the bucket, e.g. after the server reports we are over quota"""
+        with self.lock:
+            self._refill()
+            self.tokens = 0
+
+
+def is_rate_limit_error(error):
+    """Return True for a 429 or a 403 rateLimitExceeded/userRateLimitExceeded response"""
+    resp = getattr(error, 'resp', None)
+    status = getattr(resp, 'status', None)
+    if status == 429:
+        return True
+    if status == 403:
+        content = getattr(error, 'content', b'') or b''
+        if isinstance(content, bytes):
+            content = content.decode('utf-8', 'replace')
+        return any(reason in content for reason in RATE_LIMIT_REASONS)
+    return False
+
+
+def retry_after_seconds(error):
+    """Return the server's Retry-After hint in seconds, if any"""
+    resp = getattr(error, 'resp', None)
+    try:
+        return float(resp.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=1.0, cap=64.0):
+    """Exponential backoff with full jitter for the given retry attempt (0-based)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
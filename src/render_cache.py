@@ -0,0 +1,65 @@
+import os
+import json
+import hashlib
+from template_cache import file_digest
+
+
+class RenderCache:
+    """Index of which pass content each PDF under Diamond Passes/ was rendered from
+
+    A pass's key is a hash of its `data` dict, the render backend and profile, and the
+    template/asset files. When the key stored for an output file matches and
+    the file still exists, the PDF is reused instead of rendered again.
+    """
+
+    def __init__(self, index_path, source_paths):
+        self.index_path = index_path
+        self.source_digest = hashlib.sha256(
+            "".join(file_digest(path) for path in source_paths).encode()
+        ).hexdigest()
+        self.hits = 0
+        self.misses = 0
+        self.index = {}
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r') as f:
+                    self.index = json.load(f)
+            except Exception as e:
+                print(f"Warning: Could not read render cache index, starting fresh: {e}")
+
+    def key(self, data, backend='html', profile='print'):
+        payload = json.dumps({'data': data, 'backend': backend, 'profile': profile, 'sources': self.source_digest},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def lookup(self, output_path, key):
+        """Return True (and count a hit) if `output_path` was already rendered from `key`"""
+        if self.index.get(os.path.basename(output_path)) == key and os.path.exists(output_path):
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def store(self, output_path, key):
+        self.index[os.path.basename(output_path)] = key
+
+    def save(self):
+        """Write the index atomically so an interrupted run never leaves it half-written
+
+        Entries saved meanwhile by other workers (see --shards) are kept.
+        """
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            index = {}
+            if os.path.exists(self.index_path):
+                try:
+                    with open(self.index_path, 'r') as f:
+                        index = json.load(f)
+                except ValueError:
+                    pass
+            index.update(self.index)  # copied: background archive writes may still be adding entries
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            print(f"Warning: Could not save render cache index: {e}")
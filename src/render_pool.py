@@ -0,0 +1,67 @@
+import os
+import signal
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+
+
+def default_render_workers():
+    """One render worker per CPU core"""
+    return os.cpu_count() or 1
+
+
+def _ignore_interrupts():
+    # Ctrl+C reaches the whole process group; let the main process decide how to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class RenderPool:
+    """Pool of worker processes that render Diamond Pass PDFs in parallel
+
+    With `inline=True` there are no worker processes: submit() renders in
+    the calling process before returning, e.g. so a profiler can see it.
+    """
+
+    def __init__(self, render, workers=None, inline=False):
+        self.render = render
+        self.workers = max(1, workers or default_render_workers())
+        self.executor = None
+        if not inline:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_ignore_interrupts)
+        self.pending = {}
+
+    def submit(self, job, *args, **kwargs):
+        """Queue `render(*args, **kwargs)` for `job` and return straight away"""
+        if self.executor is None:
+            future = Future()
+            try:
+                future.set_result(self.render(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            future = self.executor.submit(self.render, *args, **kwargs)
+        self.pending[future] = job
+        return future
+
+    def completed(self):
+        """Yield `(job, result)` pairs as renders finish; result is None on failure"""
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        from tqdm import tqdm
+        for future in tqdm(as_completed(pending), total=len(pending), desc="Rendering passes"):
+            job = pending[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error generating PDF: {e}")
+                result = None
+            yield job, result
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_PREFIX = 'guest_passes'
+
+
+class Histogram:
+    """Cumulative-bucket duration histogram, as Prometheus expects it"""
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(DURATION_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.sum += seconds
+        self.count += 1
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+
+    def summary(self):
+        return {'count': self.count, 'sum_s': round(self.sum, 6),
+                'mean_ms': round(self.sum / self.count * 1000, 3) if self.count else None}
+
+
+def _labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in sorted(labels.items()))
+
+
+class RunMetrics:
+    """Stage timings, counters and per-pass outcomes for one run
+
+    Every pass outcome is appended to a JSON-lines run log as it happens.
+    close() adds a summary line and writes the totals in Prometheus text
+    format for the node exporter's textfile collector. Safe to use from the
+    send stage's worker threads. `labels` are added to every Prometheus
+    sample, e.g. to tell apart the files written by several workers.
+    """
+
+    def __init__(self, log_path=None, prometheus_path=None, labels=None):
+        self.log_path = log_path
+        self.prometheus_path = prometheus_path
+        self.labels = labels or {}
+        self.started = time.time()
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.log = None
+        if log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+            self.log = open(log_path, 'a', encoding='utf-8')
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the body of a `with` block as one observation of `stage`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def event(self, event, **fields):
+        """Append one record to the run log"""
+        if self.log is None:
+            return
+        record = {'ts': datetime.now().isoformat(timespec='milliseconds'), 'event': event, **fields}
+        line = json.dumps(record, default=str)
+        with self.lock:
+            self.log.write(line + '\n')
+
+    def record_pass(self, job, outcome, **fields):
+        """Count a pass's final outcome for this run and log it"""
+        self.count('passes_total', kind=job.kind, outcome=outcome)
+        self.event('pass', pass_number=job.pass_number, kind=job.kind, outcome=outcome, **fields)
+
+    def counter_totals(self):
+        totals = {}
+        for (name, labels), value in self.counters.items():
+            label_text = _labels(dict(labels))
+            totals[f"{name}{{{label_text}}}" if label_text else name] = value
+        return totals
+
+    def prometheus_text(self, duration):
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_duration_seconds Time spent in each pipeline stage",
+            f"# TYPE {METRIC_PREFIX}_stage_duration_seconds histogram"
+        ]
+        for stage, histogram in sorted(self.stages.items()):
+            stage_labels = _labels({**self.labels, 'stage': stage})
+            for bound, count in zip(DURATION_BUCKETS, histogram.counts):
+                lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_bucket{{{stage_labels},le="{bound}"}} {count}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_bucket{{{stage_labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_sum{{{stage_labels}}} {histogram.sum:.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_count{{{stage_labels}}} {histogram.count}')
+
+        by_name = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            by_name.setdefault(name, []).append((dict(labels), value))
+        for name, samples in by_name.items():
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} counter")
+            for labels, value in samples:
+                labels = {**self.labels, **labels}
+                label_text = f"{{{_labels(labels)}}}" if labels else ''
+                lines.append(f"{METRIC_PREFIX}_{name}{label_text} {value}")
+
+        run_labels = f"{{{_labels(self.labels)}}}" if self.labels else ''
+        lines += [
+            f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge",
+            f"{METRIC_PREFIX}_last_run_timestamp_seconds{run_labels} {self.started:.0f}",
+            f"# TYPE {METRIC_PREFIX}_last_run_duration_seconds gauge",
+            f"{METRIC_PREFIX}_last_run_duration_seconds{run_labels} {duration:.3f}"
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        """Log the run summary and write the Prometheus file"""
+        duration = time.time() - self.started
+        with self.lock:
+            stages = {stage: histogram.summary() for stage, histogram in self.stages.items()}
+            counters = self.counter_totals()
+        self.event('run_end', duration_s=round(duration, 3), stages=stages, counters=counters)
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+        self.write_prometheus(duration)
+
+    def write_prometheus(self, duration=None):
+        """Write the totals so far to the Prometheus file (close() does this at the end of the run)"""
+        if not self.prometheus_path:
+            return
+        if duration is None:
+            duration = time.time() - self.started
+        with self.lock:
+            text = self.prometheus_text(duration)
+        # Written atomically so the node exporter never scrapes a half-written file
+        tmp_path = self.prometheus_path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.prometheus_path)), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                f.write(text)
+            os.replace(tmp_path, self.prometheus_path)
+        except Exception as e:
+            print(f"Warning: Could not write metrics file: {e}")
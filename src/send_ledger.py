@@ -0,0 +1,183 @@
+import os
+import time
+import sqlite3
+import hashlib
+from datetime import datetime
+
+# Columns that change what a requester receives; editing any of them re-sends the pass
+LEDGER_FIELDS = ['PASS #', 'EMAIL', 'FIRST_NAME', 'DEPARTMENT', 'START', 'END',
+                 'VEHICLE_COUNT', 'ADD LOT', 'PARKMOBILE', 'EVENT']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS passes (
+    pass_number   TEXT PRIMARY KEY,
+    row_hash      TEXT NOT NULL,
+    kind          TEXT,
+    email         TEXT,
+    render_status TEXT,
+    pdf_path      TEXT,
+    send_status   TEXT,
+    message_id    TEXT,
+    error         TEXT,
+    updated_at    TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS retry_queue (
+    pass_number     TEXT PRIMARY KEY,
+    row_hash        TEXT NOT NULL,
+    email           TEXT,
+    error_class     TEXT,
+    error           TEXT,
+    attempts        INTEGER NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    updated_at      TEXT
+)
+"""
+
+
+# Field separator and missing-value marker for the hashed row text
+FIELD_SEPARATOR = '\x1f'
+MISSING = '\x00'
+
+
+def _hash_text(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def row_hash(row):
+    """Hash the ledger-relevant fields of a master file row"""
+    values = []
+    for field in LEDGER_FIELDS:
+        value = row.get(field)
+        values.append(MISSING if value is None or value != value else str(value))  # NaN -> missing
+    return _hash_text(FIELD_SEPARATOR.join(values))
+
+
+def row_hashes(df):
+    """row_hash() for every row of a DataFrame, building the hashed text column-wise"""
+    import pandas as pd
+    text = None
+    for field in LEDGER_FIELDS:
+        if field in df:
+            column = df[field].astype(str).where(df[field].notna(), MISSING)
+        else:
+            column = pd.Series(MISSING, index=df.index)
+        text = column if text is None else text + FIELD_SEPARATOR + column
+    return [_hash_text(value) for value in text.tolist()]
+
+
+class SendLedger:
+    """SQLite record of what has been rendered and emailed for each PASS #
+
+    Every status change is committed immediately, so a run that is killed
+    part way through can be resumed by simply running again.
+    """
+
+    def __init__(self, path, journal_mode='WAL'):
+        """`journal_mode` 'DELETE' is for ledgers on network drives, where WAL's shared memory doesn't work
+
+        Every process opening the same ledger must use the same journal mode.
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def needs_processing(self, pass_number, hash_value):
+        """True unless this exact row has already been sent (or spooled to the outbox) successfully"""
+        return self.skip_reason(pass_number, hash_value) is None
+
+    def skip_reason(self, pass_number, hash_value, now=None):
+        """Why this exact row shouldn't be processed now, or None if it should
+
+        'sent' once it has been sent (or spooled), 'dead' once its send has
+        failed for good, 'waiting' while a failed send waits for its retry.
+        An edited row (a different hash) is always processed.
+        """
+        found = self.conn.execute(
+            "SELECT p.row_hash, p.send_status, r.row_hash, r.next_attempt_at FROM passes p "
+            "LEFT JOIN retry_queue r ON r.pass_number = p.pass_number WHERE p.pass_number = ?",
+            (str(pass_number),)
+        ).fetchone()
+        if found is None or found[0] != hash_value:
+            return None
+        if found[1] in ('sent', 'spooled'):
+            return 'sent'
+        if found[1] == 'dead':
+            return 'dead'
+        if found[2] == hash_value and found[3] > (now or time.time()):
+            return 'waiting'
+        return None
+
+    def _upsert(self, pass_number, hash_value, **fields):
+        fields['row_hash'] = hash_value
+        fields['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        columns = ', '.join(fields)
+        placeholders = ', '.join('?' for _ in fields)
+        updates = ', '.join(f"{column} = excluded.{column}" for column in fields)
+        self.conn.execute(
+            f"INSERT INTO passes (pass_number, {columns}) VALUES (?, {placeholders}) "
+            f"ON CONFLICT(pass_number) DO UPDATE SET {updates}",
+            (str(pass_number), *fields.values())
+        )
+        self.conn.commit()
+
+    def record_render(self, pass_number, hash_value, kind, email, status, pdf_path=None, error=None):
+        """Record that a pass was rendered (or failed to); resets its send status"""
+        self._upsert(pass_number, hash_value, kind=kind, email=email, render_status=status,
+                     pdf_path=pdf_path, send_status='pending', message_id=None, error=error)
+
+    def record_send(self, pass_number, hash_value, status, message_id=None, error=None):
+        """Record a send's outcome; anything but 'failed' also takes the pass off the retry queue"""
+        if status != 'failed':
+            self.conn.execute("DELETE FROM retry_queue WHERE pass_number = ?", (str(pass_number),))
+        self._upsert(pass_number, hash_value, send_status=status, message_id=message_id, error=error)
+
+    def queue_retry(self, pass_number, hash_value, email, error_class, error, delay):
+        """Queue a failed send to be tried again in `delay(attempts)` seconds; returns its attempts so far
+
+        Attempts start again from 1 if the row has changed since it was queued.
+        """
+        found = self.conn.execute("SELECT row_hash, attempts FROM retry_queue WHERE pass_number = ?",
+                                  (str(pass_number),)).fetchone()
+        attempts = found[1] + 1 if found and found[0] == hash_value else 1
+        self.conn.execute(
+            "INSERT OR REPLACE INTO retry_queue (pass_number, row_hash, email, error_class, error, attempts, "
+            "next_attempt_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(pass_number), hash_value, email, error_class, error, attempts, time.time() + delay(attempts),
+             datetime.now().isoformat(timespec='seconds'))
+        )
+        self.conn.commit()
+        return attempts
+
+    def retry_attempts(self, pass_number, hash_value):
+        """Failed sends of this exact row so far, as counted by queue_retry()"""
+        found = self.conn.execute("SELECT row_hash, attempts FROM retry_queue WHERE pass_number = ?",
+                                  (str(pass_number),)).fetchone()
+        return found[1] if found and found[0] == hash_value else 0
+
+    def queued_retries(self):
+        return self.conn.execute("SELECT COUNT(*) FROM retry_queue").fetchone()[0]
+
+    def due_retries(self, now=None):
+        """PASS #s whose queued retry is due"""
+        return [row[0] for row in self.conn.execute(
+            "SELECT pass_number FROM retry_queue WHERE next_attempt_at <= ?", (now or time.time(),))]
+
+    def get_meta(self, key):
+        found = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return found[0] if found else None
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) "
+                          "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,102 @@
+import os
+import json
+import threading
+from datetime import datetime
+from rate_limit import is_rate_limit_error, backoff_delay
+
+# Kinds of send failure, by what fixes them
+TRANSIENT = 'transient'  # network trouble, rate limits, Gmail 5xx: trying again later works
+AUTH = 'auth'            # the saved sign-in was rejected: works again once someone signs in
+PERMANENT = 'permanent'  # Gmail refused the message itself (bad address, too big): retrying won't help
+
+# 403 reasons for a used-up daily or project quota, which frees up again later
+QUOTA_REASONS = ('dailyLimitExceeded', 'quotaExceeded', 'limitExceeded')
+
+# A pass whose send fails transiently this many times goes to the dead-letter file
+MAX_SEND_ATTEMPTS = 5
+
+# Retries wait up to RETRY_BASE_SECONDS after the first failure, doubling each time up to RETRY_MAX_SECONDS
+RETRY_BASE_SECONDS = 300
+RETRY_MAX_SECONDS = 6 * 3600
+
+
+def _status(error):
+    return getattr(getattr(error, 'resp', None), 'status', None)
+
+
+def _content(error):
+    content = getattr(error, 'content', b'') or b''
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', 'replace')
+    return content
+
+
+def classify_send_error(error):
+    """Return TRANSIENT, AUTH or PERMANENT for an exception raised while sending
+
+    Only a 401 or a token that can't be refreshed is AUTH. A 403 is a used-up
+    quota or rate limit (TRANSIENT) or a refusal of this message (PERMANENT).
+    """
+    from google.auth.exceptions import RefreshError, TransportError
+    if isinstance(error, RefreshError):
+        return AUTH
+    if isinstance(error, TransportError):
+        return TRANSIENT
+
+    status = _status(error)
+    if status is not None:
+        status = int(status)
+        if status in (408, 429) or status >= 500 or is_rate_limit_error(error):
+            return TRANSIENT
+        if status == 403 and any(reason in _content(error) for reason in QUOTA_REASONS):
+            return TRANSIENT
+        if status == 401:
+            return AUTH
+        return PERMANENT
+
+    # Connection resets, timeouts, DNS failures and anything unexpected: worth another try
+    return TRANSIENT
+
+
+def retry_delay(attempts, error_class=TRANSIENT):
+    """Seconds to wait before retrying a send that has failed `attempts` times
+
+    Sign-in failures can be retried as soon as someone has signed in again.
+    """
+    if error_class == AUTH:
+        return 0
+    return backoff_delay(attempts - 1, base=RETRY_BASE_SECONDS, cap=RETRY_MAX_SECONDS)
+
+
+class SendFailure:
+    """Falsy stand-in for a Gmail response, recording why a send failed"""
+    __slots__ = ('error', 'error_class')
+
+    def __init__(self, error, error_class=None):
+        self.error = error
+        self.error_class = error_class or classify_send_error(error)
+
+    def __bool__(self):
+        return False
+
+    def __str__(self):
+        return str(self.error) if self.error is not None else "Failed to send email"
+
+
+class DeadLetterFile:
+    """JSON-lines file of sends that failed for good, one line per pass, for someone to look into
+
+    A dead-lettered pass isn't tried again until its master file row changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def add(self, **record):
+        record = {'ts': datetime.now().isoformat(timespec='seconds'), **record}
+        line = json.dumps(record, default=str)
+        with self.lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
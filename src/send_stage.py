@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from send_retry import SendFailure
+
+
+def run_send_stage(send_job, jobs, workers=4):
+    """Send every job with a pool of worker threads
+
+    `send_job` is called once per job and returns the Gmail response, or a
+    falsy value on failure (a SendFailure if it raised). Yields `(job, result)`
+    pairs as sends finish. With `workers=0` the jobs are sent one by one on
+    the calling thread instead, e.g. so a profiler can see the sends.
+    """
+    if not jobs:
+        return
+    from tqdm import tqdm
+
+    if workers == 0:
+        for job in tqdm(jobs, desc="Sending emails"):
+            try:
+                result = send_job(job)
+            except Exception as e:
+                print(f"Error sending email: {e}")
+                result = SendFailure(e)
+            yield job, result
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(send_job, job): job for job in jobs}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Sending emails"):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error sending email: {e}")
+                result = SendFailure(e)
+            yield job, result
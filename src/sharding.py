@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import uuid
+import zlib
+import socket
+import threading
+
+# How long a worker's claim on a shard lasts without being renewed
+DEFAULT_LEASE_SECONDS = 120
+
+def shard_numbers(pass_numbers, shards):
+    """The shard (0 to shards - 1) each PASS # belongs to; stable across runs, processes and hosts"""
+    return [zlib.crc32(str(pass_number).strip().encode()) % shards for pass_number in pass_numbers]
+
+
+def shard_rows(df, shard, shards):
+    """The rows of a master file DataFrame that belong to `shard`"""
+    return df[[number == shard for number in shard_numbers(df['PASS #'].tolist(), shards)]]
+
+
+def master_file_id(csv_path):
+    """Identifies one version of the master file, so shards finished for an older version are processed again"""
+    stat = os.stat(csv_path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class ShardLease:
+    """A worker's time-limited claim on one shard, renewed on a background thread
+
+    The lease is a small JSON file naming its owner and expiry time. If the
+    owner crashes it stops renewing, and once the lease expires another
+    worker may take the shard over. Every claim creates the next numbered
+    file (`<path>.0`, `<path>.1`, ...) with an exclusive create, so when
+    several workers take over the same expired lease at once exactly one
+    of them gets it. `lost` is set if the shard is taken over while the
+    owner is still running (e.g. after a long pause), so it can stop early.
+    """
+
+    def __init__(self, path, owner, seconds=DEFAULT_LEASE_SECONDS):
+        self.path = path
+        self.owner = owner
+        self.seconds = seconds
+        self.generation = None
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _file(self, generation):
+        return f"{self.path}.{generation}"
+
+    def _generations(self):
+        directory, prefix = os.path.split(self.path)
+        suffixes = (name[len(prefix) + 1:] for name in os.listdir(directory) if name.startswith(prefix + '.'))
+        return sorted(int(suffix) for suffix in suffixes if suffix.isdigit())
+
+    def _record(self):
+        return {'owner': self.owner, 'expires': time.time() + self.seconds}
+
+    def acquire(self):
+        """Claim the shard if it is free or its lease has expired; True if this worker now holds it"""
+        generations = self._generations()
+        if generations:
+            latest = self._file(generations[-1])
+            current = _read_json(latest)
+            try:
+                if current is None:
+                    # Unreadable: being written right now, or left half-written by a crash
+                    expired = time.time() - os.path.getmtime(latest) > self.seconds
+                else:
+                    expired = current.get('expires', 0) < time.time()
+            except OSError:
+                return False  # replaced while we were looking
+            if not expired:
+                return False
+
+        generation = generations[-1] + 1 if generations else 0
+        try:
+            fd = os.open(self._file(generation), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False  # another worker claimed it first
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._record(), f)
+        self.generation = generation
+        for old in generations:
+            try:
+                os.remove(self._file(old))
+            except OSError:
+                pass
+
+        self._thread = threading.Thread(target=self._renew, name='shard-lease', daemon=True)
+        self._thread.start()
+        return True
+
+    def held(self):
+        """True while no other worker has taken the shard over; checks the lease files, not just `lost`"""
+        if not self.lost and self._generations()[-1:] != [self.generation]:
+            self.lost = True
+        return not self.lost
+
+    def _renew(self):
+        while not self._stop.wait(self.seconds / 3):
+            if not self.held():
+                generations = self._generations()
+                current = (_read_json(self._file(generations[-1])) if generations else None) or {}
+                print(f"Warning: lost the lease on {os.path.basename(self.path)} to {current.get('owner')}")
+                return
+            try:
+                _write_json(self._file(self.generation), self._record())
+            except OSError as e:
+                print(f"Warning: could not renew lease {os.path.basename(self.path)}: {e}")
+
+    def release(self):
+        """Stop renewing and let the next worker claim the shard straight away
+
+        The expired lease file is kept, so the next claim gets the next number.
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self.held():
+            try:
+                _write_json(self._file(self.generation), {'owner': self.owner, 'expires': 0})
+            except OSError:
+                pass
+
+
+class ShardBoard:
+    """Lease and result files for splitting one master file across workers
+
+    Lives in a directory every worker can see (e.g. on the shared drive).
+    A shard is done for a version of the master file once its result file
+    names that version.
+    """
+
+    def __init__(self, directory, shards, run_id):
+        self.directory = directory
+        self.shards = shards
+        self.run_id = run_id
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, shard, extension):
+        return os.path.join(self.directory, f"shard-{shard}-of-{self.shards}.{extension}")
+
+    def result(self, shard):
+        result = _read_json(self._path(shard, 'result.json'))
+        return result if result and result.get('run_id') == self.run_id else None
+
+    def results(self):
+        """Results of every finished shard, by shard number"""
+        results = {}
+        for shard in range(self.shards):
+            result = self.result(shard)
+            if result:
+                results[shard] = result
+        return results
+
+    def claim_next(self, owner, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Lease the first unfinished shard nobody holds; (shard, lease), or None if there is none right now"""
+        for shard in range(self.shards):
+            if self.result(shard):
+                continue
+            lease = ShardLease(self._path(shard, 'lease'), owner, lease_seconds)
+            if lease.acquire():
+                if self.result(shard):  # finished while we were looking
+                    lease.release()
+                    continue
+                return shard, lease
+        return None
+
+    def record_result(self, shard, owner, summary):
+        _write_json(self._path(shard, 'result.json'), {
+            'run_id': self.run_id, 'shard': shard, 'owner': owner,
+            'finished': time.time(), 'summary': summary
+        })
+
+
+def merge_summaries(summaries):
+    """Add up several PassRun summaries into one"""
+    merged = {}
+    for summary in summaries:
+        for key, value in summary.items():
+            if value is None:
+                merged.setdefault(key, None)
+            elif isinstance(value, list):
+                merged[key] = (merged.get(key) or []) + value
+            else:
+                merged[key] = (merged.get(key) or 0) + value
+    return merged
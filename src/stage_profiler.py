@@ -0,0 +1,176 @@
+import os
+import io
+import cProfile
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# Frames kept per allocation; deeper stacks make tracemalloc slower and hungrier
+TRACEMALLOC_FRAMES = 10
+
+# Lines written per stage to the sorted stats and allocation reports
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 15
+
+# Stacks deeper than this, or taking less than this share of their stage's time,
+# are left out of the collapsed-stack file
+MAX_STACK_DEPTH = 64
+MIN_STACK_SHARE = 0.0005
+
+# Allocations made by the profilers themselves, left out of the reports
+_IGNORED_ALLOCATIONS = {
+    __file__, tracemalloc.__file__, cProfile.__file__, pstats.__file__,
+    '<frozen importlib._bootstrap>', '<frozen importlib._bootstrap_external>', '<unknown>',
+}
+
+
+def _frame_name(func):
+    filename, lineno, name = func
+    if filename == '~':
+        return name  # built-in, e.g. <built-in method binascii.b2a_base64>
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+def collapsed_stacks(stats, root):
+    """Turn cProfile stats into `frame;frame;frame microseconds` lines for flame graph tools
+
+    cProfile only records who called whom, not whole stacks, so each
+    function's time is shared out among its callers in proportion to the
+    time each call edge took (the approach flameprof uses).
+    """
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller in callers:
+            callees.setdefault(caller, []).append(func)
+    roots = [func for func, entry in stats.items() if not entry[4]]
+    min_time = sum(entry[2] for entry in stats.values()) * MIN_STACK_SHARE
+    lines = {}
+
+    def walk(func, share, stack, path):
+        own_time = stats[func][2]
+        stack = stack + [_frame_name(func)]
+        micros = round(own_time * share * 1e6)
+        if micros:
+            key = ';'.join(stack)
+            lines[key] = lines.get(key, 0) + micros
+        if len(stack) >= MAX_STACK_DEPTH:
+            return
+        for callee in callees.get(func, []):
+            if callee in path:
+                continue  # recursion: its time is already counted further up
+            callee_total = stats[callee][3]
+            edge_time = stats[callee][4][func][3]
+            if callee_total and share * edge_time >= min_time:
+                walk(callee, share * edge_time / callee_total, stack, path | {callee})
+
+    for func in roots:
+        walk(func, 1.0, [root], {func})
+    return [f"{stack} {micros}" for stack, micros in lines.items()]
+
+
+class StageProfiler:
+    """cProfile and tracemalloc scoped to each pipeline stage, for --profile
+
+    Every pass through a stage adds to that stage's profile. write() saves,
+    under `output_dir`:
+
+    - `<stage>.pstats`: the raw profile, for snakeviz or `python -m pstats`
+    - `<stage>.txt`: its functions sorted by cumulative and by own time
+    - `stacks.collapsed`: every stage's stacks, for flamegraph.pl or speedscope
+    - `allocations.txt`: each stage's peak memory and the lines whose
+      allocations it kept alive
+
+    Comparing tracemalloc snapshots takes seconds once the heap is large,
+    so allocation sites come from the first pass through each stage only;
+    the peak covers every pass.
+
+    Stages must run one at a time on the thread that calls stage(); a
+    stage entered inside another is counted as part of the outer one.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.profiles = {}
+        self.allocations = {}  # stage -> StatisticDiffs of what its first pass left allocated, largest first
+        self.peaks = {}
+        self.calls = {}
+        self.active = None
+        self.started_tracemalloc = not tracemalloc.is_tracing()
+        if self.started_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    @contextmanager
+    def stage(self, name):
+        if self.active is not None:
+            yield
+            return
+        self.active = name
+        profile = self.profiles.get(name)
+        if profile is None:
+            profile = self.profiles[name] = cProfile.Profile()
+        first_pass = name not in self.calls
+        before = tracemalloc.take_snapshot() if first_pass else None
+        tracemalloc.reset_peak()
+        start_size = tracemalloc.get_traced_memory()[0]
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            peak = tracemalloc.get_traced_memory()[1] - start_size
+            if first_pass:
+                after = tracemalloc.take_snapshot()
+                self.allocations[name] = [
+                    difference for difference in after.compare_to(before, 'traceback')
+                    if difference.size_diff > 0 and difference.traceback[-1].filename not in _IGNORED_ALLOCATIONS
+                ]
+            self.peaks[name] = max(self.peaks.get(name, 0), peak)
+            self.calls[name] = self.calls.get(name, 0) + 1
+            self.active = None
+
+    def write(self):
+        """Save every stage's reports and return a one-line summary per stage"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        summary = []
+        stacks = []
+        for name, profile in self.profiles.items():
+            profile.dump_stats(os.path.join(self.output_dir, f"{name}.pstats"))
+            text = io.StringIO()
+            stats = pstats.Stats(profile, stream=text)
+            stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            stats.sort_stats('tottime').print_stats(TOP_FUNCTIONS)
+            with open(os.path.join(self.output_dir, f"{name}.txt"), 'w', encoding='utf-8') as f:
+                f.write(text.getvalue())
+            stacks += collapsed_stacks(stats.stats, name)
+            summary.append(f"{name:<12} {self.calls[name]:>5} pass(es) {stats.total_tt:>9.3f}s profiled "
+                           f"{self.peaks[name] / 2 ** 20:>9.1f} MB peak")
+
+        with open(os.path.join(self.output_dir, 'stacks.collapsed'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(stacks) + '\n')
+
+        with open(os.path.join(self.output_dir, 'allocations.txt'), 'w', encoding='utf-8') as f:
+            for name, differences in self.allocations.items():
+                kept = sum(difference.size_diff for difference in differences)
+                f.write(f"== {name}: {self.peaks[name] / 2 ** 20:.1f} MB peak, "
+                        f"{kept / 2 ** 20:.1f} MB still allocated when its first pass ended ==\n")
+                for difference in differences[:TOP_ALLOCATIONS]:
+                    f.write(f"{difference.size_diff / 1024:>10.1f} KiB {difference.count_diff:>8} blocks\n")
+                    for line in difference.traceback.format(most_recent_first=True)[:6]:
+                        f.write(f"    {line}\n")
+                f.write('\n')
+
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+        return summary
+
+
+def profile_dir(parent):
+    """A new directory under `parent` for one run's profile"""
+    base = os.path.join(parent, f"{datetime.now():%Y%m%d-%H%M%S}")
+    path, n = base, 1
+    while os.path.exists(path):
+        n += 1
+        path = f"{base}-{n}"
+    os.makedirs(path)
+    return path
@@ -0,0 +1,126 @@
+import os
+import re
+import base64
+import hashlib
+import threading
+from email.mime.image import MIMEImage
+
+PLACEHOLDER_PATTERN = re.compile(r'\{\{(\w+)\}\}')
+STYLE_BLOCK_PATTERN = re.compile(r'(<style[^>]*>)(.*?)(</style>)', re.S | re.I)
+STYLE_ATTRIBUTE_PATTERN = re.compile(r'style="([^"]*)"')
+
+# key -> (file signature, value); entries are rebuilt when a file's mtime or size changes
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _signature(paths):
+    """Return the (mtime, size) of each path; raises FileNotFoundError if one is missing"""
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def cached(key, paths, build):
+    """Return build() cached under `key` until any of `paths` changes on disk"""
+    signature = _signature(paths)
+    with _cache_lock:
+        entry = _cache.get(key)
+    if entry is not None and entry[0] == signature:
+        return entry[1]
+
+    value = build()
+    with _cache_lock:
+        _cache[key] = (signature, value)
+    return value
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def read_base64(path):
+    """Return the base64 encoding of a file, encoded once per process"""
+    def build():
+        with open(path, "rb") as f:
+            return base64.b64encode(f.read()).decode('utf-8')
+    return cached(('base64', path), [path], build)
+
+
+class CompiledTemplate:
+    """Template split once into literal text and {{placeholder}} slots
+
+    render() fills every slot in a single pass instead of one str.replace
+    per placeholder over the whole document.
+    """
+    __slots__ = ('literals', 'fields')
+
+    def __init__(self, text):
+        parts = PLACEHOLDER_PATTERN.split(text)
+        self.literals = parts[0::2]
+        self.fields = parts[1::2]
+
+    def render(self, values):
+        out = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            value = values.get(field)
+            out.append('{{' + field + '}}' if value is None else value)
+            out.append(literal)
+        return ''.join(out)
+
+
+def minify_css(css):
+    """Strip comments and the whitespace around CSS punctuation"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};:,])\s*', r'\1', css)
+    return css.replace(';}', '}').strip().rstrip(';')
+
+
+def minify_html(html):
+    """Minify <style> blocks and style attributes and collapse whitespace runs
+
+    Browsers and mail clients already treat any run of whitespace as one
+    space, so the result renders the same as the original.
+    """
+    html = STYLE_BLOCK_PATTERN.sub(lambda m: m.group(1) + minify_css(m.group(2)) + m.group(3), html)
+    html = STYLE_ATTRIBUTE_PATTERN.sub(lambda m: f'style="{minify_css(m.group(1))}"', html)
+    return re.sub(r'\s+', ' ', html).strip()
+
+
+def load_template(path, images=None, minify=False):
+    """Load and compile a template, inlining `images` ({'src="a.png"': path}) as data URIs"""
+    images = images or {}
+
+    def build():
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        for img_src, img_path in images.items():
+            text = text.replace(img_src, f'src="data:image/png;base64,{read_base64(img_path)}"')
+        if minify:
+            text = minify_html(text)
+        return CompiledTemplate(text)
+
+    return cached(('template', path, tuple(images.items()), minify), [path, *images.values()], build)
+
+
+def load_inline_image(path, content_id):
+    """Return an inline image part for `cid:<content_id>`, encoded once and shared by every message"""
+    def build():
+        with open(path, "rb") as f:
+            part = MIMEImage(f.read())
+        part.add_header('Content-ID', f'<{content_id}>')
+        part.add_header('Content-Disposition', 'inline', filename=os.path.basename(path))
+        return part
+    return cached(('inline_image', path, content_id), [path], build)
+
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of a file, hashed once per process"""
+    def build():
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    return cached(('sha256', path), [path], build)
@@ -0,0 +1,131 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Loose on purpose: catches blanks, stray spaces and typos like "guest@nd", not every RFC 5322 corner case
+EMAIL_PATTERN = r'[^@\s]+@[^@\s]+\.[A-Za-z]{2,}'
+
+# Master file columns copied into the rejected rows report, when present
+REPORT_COLUMNS = ['PASS #', 'FIRST_NAME', 'EMAIL', 'START', 'END', 'VEHICLE_COUNT_RAW']
+
+
+def _column(df, name):
+    if name in df:
+        return df[name]
+    return pd.Series(None, index=df.index, dtype=object)
+
+
+def _normalized(values):
+    """Stripped strings for hashing, with missing values as ''"""
+    return values.astype(str).str.strip().where(values.notna(), '')
+
+
+def _report(rows):
+    """The REPORT_COLUMNS of `rows`, as a new DataFrame"""
+    return pd.DataFrame({column: rows[column] for column in REPORT_COLUMNS if column in rows})
+
+
+class RowValidator:
+    """Column-wise checks that keep bad master file rows out of the render and send stages
+
+    Duplicates are found through hash indexes of every PASS # and every
+    EMAIL + dates combination seen so far, so a row that repeats one from
+    an earlier chunk is caught too. A repeated PASS # is rejected (the first
+    row wins). A repeated EMAIL + dates under another PASS # is only flagged
+    as a possible duplicate, since a department may ask for several passes
+    for one event. Call reset() before reading the master file again.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, pass_numbers=()):
+        """Forget every row seen so far; `pass_numbers` are PASS #s already taken by rows that aren't being validated"""
+        self.pass_numbers = set(pass_numbers)
+        self.requests = {}  # "email, start date, end date" -> PASS # of the first row asking for it
+
+    def validate(self, df, invalid_dates):
+        """Split the GENERATE rows of `df` into clean and rejected ones
+
+        `invalid_dates` is the mask returned by parse_date_columns(). Returns
+        `(clean, rejected, possible_duplicates)`: `df` without the rejected
+        rows, then DataFrames of the rejected rows and of the clean rows that
+        may repeat an earlier request, each with the REPORT_COLUMNS plus a
+        REASONS column.
+        """
+        generate = df['GENERATE'].astype(bool).to_numpy()
+        selected = df[generate]
+        checks = []
+
+        # read_master_file() reads PASS # as text, the same text the send ledger is keyed by
+        pass_numbers = _normalized(_column(selected, 'PASS #'))
+        missing_pass = (pass_numbers == '').to_numpy()
+        duplicate_pass = ~missing_pass & (pass_numbers.duplicated() | pass_numbers.isin(self.pass_numbers)).to_numpy()
+        self.pass_numbers.update(pass_numbers[~missing_pass].tolist())
+        checks += [(missing_pass, "missing PASS #"), (duplicate_pass, "duplicate PASS #")]
+
+        emails = _normalized(_column(selected, 'EMAIL')).str.lower()
+        missing_email = (emails == '').to_numpy()
+        bad_email = ~missing_email & ~emails.str.fullmatch(EMAIL_PATTERN).to_numpy()
+        checks += [(missing_email, "missing EMAIL"), (bad_email, "EMAIL is not a valid address")]
+
+        bad_dates = invalid_dates[generate].to_numpy()
+        # Whole dates: JavaScript-style dates are cut to midnight, but ISO timestamps keep their time of day
+        end_before_start = ~bad_dates & (selected['END_DATE'].dt.normalize()
+                                         < selected['START_DATE'].dt.normalize()).to_numpy()
+        checks += [(bad_dates, "START or END is not a date"), (end_before_start, "END is before START")]
+
+        raw_counts = selected['VEHICLE_COUNT_RAW'] if 'VEHICLE_COUNT_RAW' in selected else selected['VEHICLE_COUNT']
+        counts = pd.to_numeric(raw_counts, errors='coerce')
+        bad_count = (counts.isna() | (counts < 1) | (counts % 1 != 0)).to_numpy()
+        checks.append((bad_count, "VEHICLE_COUNT is not a whole number of at least 1"))
+
+        rejected_mask = np.logical_or.reduce([mask for mask, _ in checks])
+        full_mask = np.zeros(len(df), dtype=bool)
+        full_mask[np.flatnonzero(generate)] = rejected_mask
+        clean = df[~full_mask]
+
+        # The same recipient asking twice for the same dates under different PASS #s
+        request_keys = (emails + ', ' + selected['START_DATE'].astype(str) + ', '
+                        + selected['END_DATE'].astype(str))
+        keys = request_keys[~rejected_mask]
+        possible_duplicate = np.zeros(len(selected), dtype=bool)
+        possible_duplicate[~rejected_mask] = (keys.duplicated() | keys.isin(self.requests)).to_numpy()
+        firsts = ~keys.isin(self.requests) & ~keys.duplicated()
+        self.requests.update(zip(keys[firsts].tolist(), pass_numbers[~rejected_mask][firsts].tolist()))
+
+        # Only the (few) reported rows get their reasons spelt out row by row
+        rejected = _report(selected[rejected_mask])
+        if not rejected.empty:
+            rejected['REASONS'] = ['; '.join(reason for mask, reason in checks if mask[i])
+                                   for i in np.flatnonzero(rejected_mask)]
+        duplicates = _report(selected[possible_duplicate])
+        if not duplicates.empty:
+            originals = request_keys[possible_duplicate].map(self.requests).tolist()
+            duplicates['REASONS'] = [f"possible duplicate (still processed): same EMAIL and dates as PASS # {original}"
+                                     for original in originals]
+        return clean, rejected, duplicates
+
+
+class RejectedRowsReport:
+    """CSV of the rows validation kept out of a run (and of possible duplicates), appended to as they are found
+
+    A report left by an earlier run is removed when the report is opened,
+    so the file only ever lists the current run's rejections.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def write(self, rejected):
+        if rejected.empty:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        rejected.rename(columns={'VEHICLE_COUNT_RAW': 'VEHICLE_COUNT'}).to_csv(
+            self.path, mode='a', header=self.rows == 0, index=False)
+        self.rows += len(rejected)